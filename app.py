@@ -181,12 +181,24 @@ app.layout = dmc.MantineProvider(
                     dmc.Card(
                         [
                             dmc.Title("Step 3 · Convert to MBTiles", order=4),
-                            dmc.Button("Create MBTiles", id="mbtiles-button"),
+                            dmc.Group(
+                                [
+                                    dmc.Button("Create MBTiles", id="mbtiles-button"),
+                                    dmc.Button("Estimate", id="mbtiles-estimate-button", variant="outline"),
+                                ]
+                            ),
+                            dmc.Space(h=5),
+                            dmc.Switch(
+                                id="mbtiles-incremental",
+                                label="Incremental update (re-encode changed tiles only)",
+                                checked=False,
+                            ),
                             dmc.Space(h=5),
                             dmc.Progress(id="mbtiles-progress", value=0, striped=True, color="blue"),
                             dmc.Space(h=5),
                             dmc.Text("Waiting...", id="mbtiles-status", c="gray"),
                             dmc.Text("", id="mbtiles-details", size="sm", c="dimmed"),
+                            dmc.Text("", id="mbtiles-estimate", size="sm", c="dimmed", style={"whiteSpace": "pre-line"}),
                         ],
                         withBorder=True,
                         padding="lg",
@@ -236,6 +248,7 @@ app.layout = dmc.MantineProvider(
             dcc.Store(id="download-job-store"),
             dcc.Store(id="process-job-store"),
             dcc.Store(id="mbtiles-job-store"),
+            dcc.Store(id="mbtiles-estimate-job-store"),
             dcc.Store(id="download-metadata-store", data=c_cached_download),
             dcc.Store(id="processed-store", data=c_cached_processed),
             dcc.Store(id="mbtiles-metadata-store", data=c_cached_mbtiles),
@@ -279,22 +292,26 @@ def handle_polygon_upload(contents: str | None, filename: str | None):
     Output("process-button", "disabled"),
     Output("process-step-trigger", "disabled"),
     Output("mbtiles-button", "disabled"),
+    Output("mbtiles-estimate-button", "disabled"),
     Input("download-job-store", "data"),
     Input("process-job-store", "data"),
     Input("mbtiles-job-store", "data"),
+    Input("mbtiles-estimate-job-store", "data"),
     Input("polygon-store", "data"),
     Input("download-metadata-store", "data"),
     Input("processed-store", "data"),
 )
-def coordinator_button_states(download_job, process_job, mbtiles_job, polygon_store, download_meta, processed_meta):
+def coordinator_button_states(download_job, process_job, mbtiles_job, estimate_job, polygon_store, download_meta, processed_meta):
     download_running = bool(download_job and download_job.get("job_id"))
     process_running = bool(process_job and process_job.get("job_id"))
     mbtiles_running = bool(mbtiles_job and mbtiles_job.get("job_id"))
+    estimate_running = bool(estimate_job and estimate_job.get("job_id"))
 
     download_disabled = download_running
     process_disabled = process_running
     mbtiles_disabled = mbtiles_running
-    return download_disabled, process_disabled, process_disabled, mbtiles_disabled
+    estimate_disabled = mbtiles_running or estimate_running
+    return download_disabled, process_disabled, process_disabled, mbtiles_disabled, estimate_disabled
 
 
 @app.callback(
@@ -432,8 +449,21 @@ def update_mbtiles_details(meta):
     if not meta:
         return "No MBTiles conversion performed."
     path = Path(meta.get("mbtiles_path", "")).name
+    if meta.get("pmtiles_path"):
+        path = f"{path} + {Path(meta['pmtiles_path']).name}"
     ts = meta.get("timestamp", "")
-    return f"File: {path} · {ts}"
+    stats = meta.get("stats") or {}
+    summary = ""
+    if stats.get("total", {}).get("tiles"):
+        total = stats["total"]
+        summary = f" · {total['tiles']} tiles, p90 {total['p90'] / 1024:.1f} KB"
+        if stats.get("largest_tiles"):
+            largest = stats["largest_tiles"][0]
+            summary += f", largest {largest['z']}/{largest['x']}/{largest['y']} ({largest['bytes'] / 1024:.1f} KB)"
+    incremental = meta.get("incremental")
+    if incremental:
+        return f"File: {path} · {incremental['tiles_updated']} tiles updated{summary} · {ts}"
+    return f"File: {path}{summary} · {ts}"
 
 
 @app.callback(
@@ -550,19 +580,22 @@ def monitor_process_job(_n, job_data):
     Output("mbtiles-status", "color", allow_duplicate=True),
     Input("mbtiles-button", "n_clicks"),
     State("processed-store", "data"),
+    State("mbtiles-incremental", "checked"),
     prevent_initial_call=True,
     allow_duplicate=True,
 )
-def start_mbtiles_job(n_clicks, processed_store):
+def start_mbtiles_job(n_clicks, processed_store, incremental):
     if not n_clicks:
         raise PreventUpdate
     print(f"[callback] start_mbtiles_job triggered (n_clicks={n_clicks}, processed_store={'set' if processed_store else 'missing'})", flush=True)
     if not processed_store:
         return None, 0, "No processed GeoJSON available.", "red"
-    print("[callback] MBTiles button accepted, stopping tile server before rebuild…", flush=True)
-    tileserver_manager.stop()
     print("[callback] MBTiles button accepted, creating job…", flush=True)
-    job = job_manager.create_job(convert_to_mbtiles, processed_metadata=processed_store)
+    job = job_manager.create_job(
+        convert_to_mbtiles,
+        processed_metadata=processed_store,
+        incremental=bool(incremental),
+    )
     return {"job_id": job.job_id}, 5, "Converting...", "blue"
 
 
@@ -585,7 +618,7 @@ def monitor_mbtiles_job(_n, job_data):
         return 0, "Job not found.", "red", None, no_update
     if job.status == "completed":
         print("[callback] MBTiles job completed", flush=True)
-        tileserver_manager.start()
+        tileserver_manager.reload()
         return 100, "MBTiles ready.", "green", None, job.result
     if job.status == "failed":
         print(f"[callback] MBTiles job failed: {job.error}", flush=True)
@@ -594,14 +627,79 @@ def monitor_mbtiles_job(_n, job_data):
     return progress_value, job.message or "Converting...", "blue", job_data, no_update
 
 
+@app.callback(
+    Output("mbtiles-estimate-job-store", "data", allow_duplicate=True),
+    Output("mbtiles-estimate", "children", allow_duplicate=True),
+    Input("mbtiles-estimate-button", "n_clicks"),
+    State("processed-store", "data"),
+    prevent_initial_call=True,
+    allow_duplicate=True,
+)
+def start_mbtiles_estimate_job(n_clicks, processed_store):
+    if not n_clicks:
+        raise PreventUpdate
+    if not processed_store:
+        return None, "No processed GeoJSON available."
+    print("[callback] MBTiles estimate requested, creating job…", flush=True)
+    job = job_manager.create_job(convert_to_mbtiles, processed_metadata=processed_store, dry_run=True)
+    return {"job_id": job.job_id}, "Estimating..."
+
+
+@app.callback(
+    Output("mbtiles-estimate", "children", allow_duplicate=True),
+    Output("mbtiles-estimate-job-store", "data", allow_duplicate=True),
+    Input("job-poll", "n_intervals"),
+    State("mbtiles-estimate-job-store", "data"),
+    prevent_initial_call=True,
+    allow_duplicate=True,
+)
+def monitor_mbtiles_estimate_job(_n, job_data):
+    if not job_data or not job_data.get("job_id"):
+        raise PreventUpdate
+    job = job_manager.get_job(job_data["job_id"])
+    if not job:
+        return "Job not found.", None
+    if job.status == "completed":
+        return _format_estimate(job.result), None
+    if job.status == "failed":
+        print(f"[callback] MBTiles estimate failed: {job.error}", flush=True)
+        return job.error or "Estimate failed.", None
+    return f"{job.message or 'Estimating...'} ({job.progress * 100:.0f}%)", job_data
+
+
+def _format_estimate(result: dict) -> str:
+    estimate = result["estimate"]
+    total = estimate["total"]
+    sampled = sum(layer["sampled"] for layer in estimate["layers"].values())
+    features = sum(layer["features"] for layer in estimate["layers"].values())
+    basis = "exact tile counts" if estimate["exact_tile_counts"] else f"{sampled} of {features} features sampled"
+    if result.get("tippecanoe"):
+        # Only the Python builder is calibrated: no time, and the size is the Python builder's.
+        lines = [
+            f"Estimate ({basis}): ~{total['tiles']} tiles, {total['bytes'] / 1e6:.1f} MB "
+            "if built with the Python builder"
+        ]
+        for zoom, row in estimate["zooms"].items():
+            lines.append(f"z{zoom}: {row['tiles']} tiles · {row['bytes'] / 1024:.0f} KB")
+        lines.append("tippecanoe is installed and will be used for the actual build; its size and time are not estimated.")
+        return "\n".join(lines)
+    lines = [
+        f"Estimate ({basis}): ~{total['tiles']} tiles, {total['bytes'] / 1e6:.1f} MB, "
+        f"~{estimate['build_seconds']:.0f} s with the Python builder "
+        f"(load {estimate['load_seconds']:.0f} s + encode {estimate['encode_seconds']:.0f} s)"
+    ]
+    for zoom, row in estimate["zooms"].items():
+        lines.append(f"z{zoom}: {row['tiles']} tiles · {row['bytes'] / 1024:.0f} KB · {row['encode_seconds']:.1f} s")
+    return "\n".join(lines)
+
+
 @app.callback(
     Output("local-tile-card", "style"),
     Input("mbtiles-metadata-store", "data"),
     Input("mbtiles-job-store", "data"),
 )
 def toggle_local_tile_card(meta, mbtiles_job):
-    if mbtiles_job and mbtiles_job.get("job_id"):
-        return {"display": "none"}
+    # The previous tileset stays online while a new one is built next to it.
     if meta and meta.get("mbtiles_path"):
         tileserver_manager.start()
         return {"display": "block"}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal
@@ -21,6 +22,15 @@ class LayerConfig:
     geometry: Literal["polygon", "line"]
     color: str = "#3388ff"
     line_width: float = 1.2
+    importance: int = 0
+    """Higher values survive longer when a tile exceeds its size budget."""
+    min_zoom: int | None = None
+    max_zoom: int | None = None
+    """Zoom range the layer is tiled for; ``None`` falls back to the global MBTiles range."""
+    aggregate_below: int | None = None
+    aggregate: Literal["grid", "points", "dissolve"] = "grid"
+    """Python builder: below ``aggregate_below`` replace the features with per-tile aggregates,
+    a density ``grid`` or count ``points`` per ``fclass``, or ``dissolve``d classes."""
 
 
 DEFAULT_LAYERS: list[LayerConfig] = [
@@ -29,18 +39,23 @@ DEFAULT_LAYERS: list[LayerConfig] = [
         shapefile="gis_osm_buildings_a_free_1.shp",
         geometry="polygon",
         color="#FA7921",
+        min_zoom=10,
+        aggregate_below=13,
     ),
     LayerConfig(
         name="landuse",
         shapefile="gis_osm_landuse_a_free_1.shp",
         geometry="polygon",
         color="#91C499",
+        importance=1,
+        min_zoom=8,
     ),
     LayerConfig(
         name="water",
         shapefile="gis_osm_water_a_free_1.shp",
         geometry="polygon",
         color="#1868AE",
+        importance=3,
     ),
     LayerConfig(
         name="roads",
@@ -48,6 +63,9 @@ DEFAULT_LAYERS: list[LayerConfig] = [
         geometry="line",
         color="#F3A712",
         line_width=1.6,
+        importance=3,
+        aggregate_below=9,
+        aggregate="dissolve",
     ),
     LayerConfig(
         name="railways",
@@ -55,12 +73,16 @@ DEFAULT_LAYERS: list[LayerConfig] = [
         geometry="line",
         color="#B02E0C",
         line_width=1.4,
+        importance=2,
+        min_zoom=8,
     ),
     LayerConfig(
         name="powerlines",
         shapefile="gis_osm_powerlines_free_1.shp",
         geometry="line",
         color="#595959",
+        importance=1,
+        min_zoom=10,
     ),
 ]
 
@@ -77,11 +99,48 @@ APP_CONFIG = {
         "min_zoom": 4,
         "max_zoom": 16,
         "tippecanoe_cmd": "tippecanoe",
+        "workers": max(1, (os.cpu_count() or 2) - 1),
+        "gzip_level": 6,
+        "simplify_pixels": 1.0,
+        "min_feature_pixels": 1.0,
+        "attribute_zoom": 12,
+        "max_tile_bytes": 500_000,
+        "max_tile_features": 200_000,
+        # Commit every N blocks of tiles so an interrupted build resumes (0 disables).
+        "checkpoint_blocks": 64,
+        # Also write a PMTiles v3 archive (single static file) next to the MBTiles.
+        "pmtiles": False,
+        "pmtiles_output": TILESERVER_DIR / "osm_layers.pmtiles",
+        # Number of largest (and, for the Python builder, slowest) tiles in the build report.
+        "stats_top_n": 10,
+        # Python builder: spool features to disk and visit tiles from sorted runs instead of
+        # holding every layer in memory (for extracts larger than RAM).
+        "external_memory": False,
+        # (tile, feature) pairs sorted in memory per on-disk run in external-memory mode.
+        "spool_run_pairs": 4_000_000,
+        # Python builder: cluster the tile table on a per-zoom Hilbert key and write tiles
+        # in that order so a viewport's tiles share pages (the tile server follows suit).
+        "hilbert_layout": True,
+        # Dry-run estimate: features sampled per layer and tiles encoded per zoom to
+        # calibrate size and time.
+        "estimate_sample_features": 20_000,
+        "estimate_calibration_tiles": 8,
     },
     "tileserver": {
         "port": 8090,
         "config_path": TILESERVER_DIR / "tileserver.config.json",
         "mbtiles": TILESERVER_DIR / "osm_layers.mbtiles",
+        "pmtiles": TILESERVER_DIR / "osm_layers.pmtiles",
         "style_url": "http://127.0.0.1:8090/styles/osm-bright/style.json",
+        # Python tile server: per-thread read-only SQLite connections map this many bytes
+        # of the MBTiles into memory and keep a page cache of this many KiB each.
+        "sqlite_mmap_bytes": 256 * 1024 * 1024,
+        "sqlite_cache_kib": 8192,
+        # In-memory LRU of served tiles (including misses), bounded in bytes; 0 disables it.
+        "tile_cache_bytes": 64 * 1024 * 1024,
+        # Cache-Control max-age of tiles, metadata and style; tile URLs carrying the
+        # tileset version (as the style's do) get the long one.
+        "http_max_age": 300,
+        "http_versioned_max_age": 365 * 24 * 3600,
     },
 }
@@ -0,0 +1,202 @@
+"""Dry-run estimate of a Python tile build: tiles, encoded size and build time per zoom.
+
+``estimate_build`` streams every layer once and keeps a uniform random sample of its
+features. The tiles the sampled bounding boxes touch (after the builder's per-zoom size
+filter) are counted per zoom; when a layer fits in the sample the count is exact,
+otherwise every touched tile is weighted by the inverse of its probability of being
+touched by the sample (Horvitz-Thompson). A short calibration run then encodes a few of
+those tiles per zoom from the sample with the real builder (``count_tiles`` and
+``encode_tiles`` of ``VectorMBTilesBuilder``), and the bytes and seconds per feature it
+measures are extrapolated to the estimated feature count of every tile (see
+``_estimate_zoom``).
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Sequence, Tuple
+
+import numpy as np
+
+from .geojson_stream import iter_features
+from .mbtiles import GeoJSONLayerIndex, VectorMBTilesBuilder
+
+
+def _sample_layer(path: Path, sample_size: int, rng: random.Random) -> Tuple[int, list[dict]]:
+    """Count the features of ``path`` and keep a reservoir sample of them in file order."""
+    sample: list[Tuple[int, dict]] = []
+    total = 0
+    for feature in iter_features(path):
+        if not feature.get("geometry"):
+            continue
+        if len(sample) < sample_size:
+            sample.append((total, feature))
+        else:
+            slot = rng.randrange(total + 1)
+            if slot < sample_size:
+                sample[slot] = (total, feature)
+        total += 1
+    sample.sort(key=lambda item: item[0])
+    return total, [feature for _, feature in sample]
+
+
+def _sample_index(name: str, path: Path, features: Sequence[dict]) -> GeoJSONLayerIndex:
+    with path.open("w", encoding="utf-8") as handle:
+        for feature in features:
+            handle.write(json.dumps(feature) + "\n")
+    return GeoJSONLayerIndex(name, path)
+
+
+def estimate_build(
+    builder: VectorMBTilesBuilder,
+    layers: Sequence[Tuple[str, str]],
+    sample_size: int = 20_000,
+    calibration_tiles: int = 8,
+    progress_callback: Callable[[float, str], None] | None = None,
+    seed: int = 0,
+) -> dict:
+    """Estimate what ``builder.build(layers)`` would produce without building it.
+
+    Returns per-layer feature counts and sample sizes (``layers``), per-zoom estimated
+    tiles, bytes and encoding seconds (``zooms``), their totals (``total``) and the
+    expected ``load_seconds``, ``encode_seconds`` (spread over the builder's workers) and
+    ``build_seconds``. ``exact_tile_counts`` is true when every layer was sampled whole.
+    """
+    started = time.perf_counter()
+    progress = progress_callback or (lambda pct, message: None)
+    rng = random.Random(seed)
+    layer_stats: dict[str, dict] = {}
+    fractions: dict[str, float] = {}
+    load_seconds = 0.0
+
+    with tempfile.TemporaryDirectory(prefix="tile-estimate-") as tmpdir:
+        samples: list[Tuple[GeoJSONLayerIndex, GeoJSONLayerIndex]] = []
+        for number, (name, path) in enumerate(layers):
+            progress(0.6 * number / max(len(layers), 1), f"Sampling {name}...")
+            total, features = _sample_layer(Path(path), sample_size, rng)
+            load_started = time.perf_counter()
+            sample = _sample_index(name, Path(tmpdir) / f"{number:03d}.geojsonl", features)
+            if features:
+                load_seconds += (time.perf_counter() - load_started) * total / len(features)
+            half = _sample_index(name, Path(tmpdir) / f"{number:03d}-half.geojsonl", features[::2])
+            samples.append((sample, half))
+            fractions[name] = len(features) / total if total else 1.0
+            layer_stats[name] = {"features": total, "sampled": len(features)}
+
+        zooms: dict[str, dict] = {}
+        calibration_zooms = range(builder.min_zoom, builder.max_zoom + 1)
+        for step, zoom in enumerate(calibration_zooms):
+            progress(0.6 + 0.4 * step / len(calibration_zooms), f"Calibrating zoom {zoom}...")
+            zoom_stats = _estimate_zoom(builder, samples, fractions, zoom, calibration_tiles, rng)
+            if zoom_stats:
+                zooms[str(zoom)] = zoom_stats
+
+    encode_seconds = sum(stats["encode_seconds"] for stats in zooms.values()) / max(builder.workers, 1)
+    progress(1.0, "Estimate ready.")
+    return {
+        "layers": layer_stats,
+        "zooms": zooms,
+        "total": {
+            "tiles": sum(stats["tiles"] for stats in zooms.values()),
+            "bytes": sum(stats["bytes"] for stats in zooms.values()),
+        },
+        "load_seconds": round(load_seconds, 2),
+        "encode_seconds": round(encode_seconds, 2),
+        "build_seconds": round(load_seconds + encode_seconds, 2),
+        "exact_tile_counts": all(fraction >= 1.0 for fraction in fractions.values()),
+        "estimate_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _estimate_zoom(
+    builder: VectorMBTilesBuilder,
+    samples: Sequence[Tuple[GeoJSONLayerIndex, GeoJSONLayerIndex]],
+    fractions: dict[str, float],
+    zoom: int,
+    calibration_tiles: int,
+    rng: random.Random,
+) -> dict | None:
+    """Estimated tiles, bytes and encoding seconds at ``zoom``.
+
+    The calibration tiles are encoded from the sample and from half of it. How bytes and
+    seconds grow between the two (``features ** exponent``) is what scales them up to
+    the full feature count, so aggregated layers and per-tile overheads, which grow
+    slower than the features, are not extrapolated linearly.
+    """
+    keys: list[np.ndarray] = []
+    sampled: list[np.ndarray] = []
+    estimated: list[np.ndarray] = []
+    log_missed: list[np.ndarray] = []
+    half_keys: list[np.ndarray] = []
+    half_sampled: list[np.ndarray] = []
+    for layer, half in samples:
+        layer_keys, counts = builder.count_tiles(layer, zoom)
+        if not len(layer_keys):
+            continue
+        fraction = fractions[layer.name]
+        keys.append(layer_keys)
+        sampled.append(counts)
+        estimated.append(counts / fraction)
+        # log P(the sample misses every feature of this layer in the tile)
+        log_missed.append(counts / fraction * np.log1p(-fraction) if fraction < 1 else np.full(len(counts), -np.inf))
+        if len(half):
+            for collected, array in zip((half_keys, half_sampled), builder.count_tiles(half, zoom)):
+                collected.append(array)
+    if not sum(len(layer_keys) for layer_keys in keys):
+        return None
+
+    tile_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    sampled_features = np.bincount(inverse, weights=np.concatenate(sampled))
+    features = np.bincount(inverse, weights=np.concatenate(estimated))
+    missed = np.exp(np.bincount(inverse, weights=np.concatenate(log_missed)))
+    weights = 1.0 / (1.0 - missed)
+
+    chosen = sorted(rng.sample(range(len(tile_keys)), min(calibration_tiles, len(tile_keys))))
+    tile_ids = [builder.tile_from_key(int(tile_keys[index])) for index in chosen]
+    full_bytes, full_seconds, non_empty = _calibrate(builder, tile_ids, [layer for layer, _ in samples])
+    full_features = float(sampled_features[chosen].sum())
+    bytes_exponent = seconds_exponent = 1.0
+    if any(fraction < 1 for fraction in fractions.values()) and half_keys:
+        half_bytes, half_seconds, _ = _calibrate(builder, tile_ids, [half for _, half in samples])
+        in_chosen = np.isin(np.concatenate(half_keys), tile_keys[chosen])
+        half_features = float(np.concatenate(half_sampled)[in_chosen].sum())
+        bytes_exponent = _growth_exponent(full_bytes, half_bytes, full_features, half_features)
+        seconds_exponent = _growth_exponent(full_seconds, half_seconds, full_features, half_features)
+
+    # Per tile: the calibration rate per sampled feature, scaled up by the growth from
+    # the sampled to the estimated feature count.
+    scale_up = features / np.maximum(sampled_features, 1.0)
+    tile_bytes = full_bytes / max(full_features, 1.0) * sampled_features * scale_up**bytes_exponent
+    if builder.max_tile_bytes:
+        tile_bytes = np.minimum(tile_bytes, builder.max_tile_bytes)
+    tile_seconds = full_seconds / max(full_features, 1.0) * sampled_features * scale_up**seconds_exponent
+    return {
+        "tiles": int(round(weights.sum() * non_empty)),
+        "bytes": int(round((weights * tile_bytes).sum())),
+        "encode_seconds": round(float((weights * tile_seconds).sum()), 2),
+        "calibration_tiles": len(tile_ids),
+    }
+
+
+def _calibrate(
+    builder: VectorMBTilesBuilder,
+    tile_ids: Sequence[Tuple[int, int, int]],
+    layers: Sequence[GeoJSONLayerIndex],
+) -> Tuple[float, float, float]:
+    """Encode ``tile_ids``: total bytes, total seconds and the share of non-empty tiles."""
+    started = time.perf_counter()
+    encoded = builder.encode_tiles(tile_ids, layers)
+    seconds = time.perf_counter() - started
+    non_empty = sum(1 for _, data in encoded if data) / max(len(encoded), 1)
+    return float(sum(len(data or b"") for _, data in encoded)), seconds, non_empty
+
+
+def _growth_exponent(full: float, half: float, full_features: float, half_features: float) -> float:
+    """``k`` in ``value ~ features ** k`` from two calibration runs, clamped to ``[0, 1]``."""
+    if full <= 0 or half <= 0 or half_features <= 0 or full_features <= half_features:
+        return 1.0
+    return float(np.clip(np.log(full / half) / np.log(full_features / half_features), 0.0, 1.0))
@@ -0,0 +1,125 @@
+"""Incremental GeoJSON reader.
+
+Features are parsed one at a time from a FeatureCollection file (or from newline-
+delimited GeoJSON / RFC 8142 GeoJSONSeq), so callers never hold the raw file text and
+the whole parsed tree at the same time.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterator, TextIO
+
+CHUNK_SIZE = 1 << 20
+RECORD_SEPARATOR = "\x1e"
+SEQUENCE_SUFFIXES = {".geojsonl", ".geojsons", ".geojsonseq", ".ndjson", ".jsonl"}
+
+_WHITESPACE = " \t\n\r" + RECORD_SEPARATOR
+_DECODER = json.JSONDecoder()
+
+
+class _Buffer:
+    """Sliding text window over a file for ``JSONDecoder.raw_decode``."""
+
+    def __init__(self, handle: TextIO, chunk_size: int):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = 0) -> bool:
+        """Append at least ``chunk_size`` (or ``size``) more characters to the window."""
+        if self.eof:
+            return False
+        chunk = self.handle.read(max(self.chunk_size, size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character (``""`` at the end of the file)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid GeoJSON: expected {char!r}, found {found or 'end of file'!r}.")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete.
+
+        Each retry decodes the value again from its start, so the window at least doubles
+        per retry: a value spanning many chunks is then decoded a bounded number of times
+        over instead of once per chunk.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill(len(self.text) - self.pos):
+                    continue
+                raise
+            # A number that ends exactly at the window edge may continue in the next chunk.
+            if end == len(self.text) and self.fill(len(self.text) - self.pos):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(path: Path | str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """Yield the features of a GeoJSON FeatureCollection or newline-delimited GeoJSON file."""
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as handle:
+        buffer = _Buffer(handle, chunk_size)
+        if path.suffix.lower() in SEQUENCE_SUFFIXES:
+            yield from _iter_sequence(buffer)
+            return
+        if buffer.peek() == "":
+            return
+        buffer.expect("{")
+        header: dict = {}
+        while buffer.peek() != "}":
+            key = buffer.value()
+            buffer.expect(":")
+            if key == "features":
+                yield from _iter_array(buffer)
+            else:
+                header[key] = buffer.value()
+            if buffer.peek() == ",":
+                buffer.pos += 1
+        buffer.expect("}")
+        if header.get("type") == "Feature":
+            # Newline-delimited features in a file with a plain .geojson suffix.
+            yield header
+            yield from _iter_sequence(buffer)
+
+
+def _iter_array(buffer: _Buffer) -> Iterator[dict]:
+    buffer.expect("[")
+    while buffer.peek() != "]":
+        yield buffer.value()
+        if buffer.peek() == ",":
+            buffer.pos += 1
+    buffer.expect("]")
+
+
+def _iter_sequence(buffer: _Buffer) -> Iterator[dict]:
+    while buffer.peek():
+        record = buffer.value()
+        if isinstance(record, dict) and record.get("type") == "FeatureCollection":
+            yield from record.get("features", [])
+        else:
+            yield record
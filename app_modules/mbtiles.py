@@ -1,238 +1,2035 @@
 from __future__ import annotations
 
+import gzip
+import hashlib
+import heapq
 import json
+import math
+import multiprocessing
+import shutil
 import sqlite3
+import tempfile
+import time
+from array import array
+from collections import deque
 from dataclasses import dataclass
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import Iterable, List, Sequence, Tuple
-import time
-from numbers import Integral
+from typing import Callable, Iterable, Iterator, List, Mapping, Sequence, Tuple
 
 import mercantile
 import mapbox_vector_tile
-from shapely.geometry import box, mapping, shape
+import numpy as np
+import shapely
+from shapely.geometry import shape
 from shapely.strtree import STRtree
 
+from .geojson_stream import iter_features
+from .pmtiles import tileid_to_zxy, zxy_to_tileid
+from .publish import UPDATED_IN_PLACE_TABLE, publish_file, released, remove_sqlite_file, staging_path
+from .spool import FeatureSpool, SortedRuns
+
+TILE_PIXELS = 256
+MVT_EXTENT = 4096
+EARTH_RADIUS = 6378137.0
+MAX_LATITUDE = 85.0511287798066
+_POLYGON_TYPES = ("Polygon", "MultiPolygon")
+_POLYGON_TYPE_IDS = (3, 6)
+_LINE_TYPE_IDS = (1, 2, 5)
+# Low-zoom replacements for a layer's features, see ``VectorMBTilesBuilder.layer_aggregates``.
+AGGREGATE_MODES = ("grid", "points", "dissolve")
+# Out-of-core builds close a block once its tiles reference this many features.
+_SPOOL_BLOCK_PAIRS = 65_536
+# shapely >= 2.1 can orient polygons vectorized; older versions let the encoder do it.
+_ORIENT_POLYGONS = hasattr(shapely, "orient_polygons")
+
+
+def _to_web_mercator(geoms: np.ndarray) -> np.ndarray:
+    """Project an array of lon/lat geometries to EPSG:3857 in one vectorized pass."""
+
+    def _project(coords: np.ndarray) -> np.ndarray:
+        lon = coords[:, 0]
+        lat = np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+        x = np.radians(lon) * EARTH_RADIUS
+        y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * EARTH_RADIUS
+        return np.column_stack((x, y))
+
+    return shapely.transform(geoms, _project)
+
+
+def _to_tile_coords(geoms: np.ndarray, tile_bounds: np.ndarray, extent: int = MVT_EXTENT) -> np.ndarray:
+    """Map Web Mercator geometries to integer tile-local coordinates (y pointing down).
+
+    ``tile_bounds`` holds one (left, bottom, right, top) row per geometry, so geometries
+    from many tiles are converted in a single pass.
+    """
+    counts = shapely.get_num_coordinates(geoms)
+    origin = np.repeat(tile_bounds[:, [0, 3]], counts, axis=0)
+    size = np.repeat(tile_bounds[:, 2:] - tile_bounds[:, :2], counts, axis=0)
+    scale = np.array([extent, -extent]) / size
+    coords = np.rint((shapely.get_coordinates(geoms) - origin) * scale)
+    return shapely.set_coordinates(geoms.copy(), coords)
+
+
+def _tile_bounds_array(tile_ids: Sequence[Tuple[int, int, int]]) -> np.ndarray:
+    """Web Mercator (left, bottom, right, top) of every ``(z, x, y)`` tile."""
+    return np.array(
+        [tuple(mercantile.xy_bounds(x, y, z)) for z, x, y in tile_ids],
+        dtype=float,
+    ).reshape(-1, 4)
+
+
+def _geometry_columns(geoms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dimension (2 polygon, 1 line, 0 other) and size (area, length, ``inf``) per geometry."""
+    type_ids = shapely.get_type_id(geoms)
+    polygons = np.isin(type_ids, _POLYGON_TYPE_IDS)
+    lines = np.isin(type_ids, _LINE_TYPE_IDS)
+    dimensions = np.select([polygons, lines], [2, 1], 0).astype(np.int8)
+    sizes = np.select([polygons, lines], [shapely.area(geoms), shapely.length(geoms)], np.inf)
+    return dimensions, sizes
+
+
+def _clip_pairs(
+    tile_pos: np.ndarray,
+    feature_idx: np.ndarray,
+    geoms: np.ndarray,
+    feature_bounds: np.ndarray,
+    tile_bounds: np.ndarray,
+    dimensions: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clip (tile, feature) pairs sorted by tile; features inside their tile are kept as-is.
+
+    ``geoms``, ``feature_bounds`` and ``dimensions`` are per pair, ``tile_bounds`` per tile.
+    Empty results are dropped.
+    """
+    clipped = geoms.copy()
+    pair_bounds = tile_bounds[tile_pos]
+    inside = np.all(feature_bounds[:, :2] >= pair_bounds[:, :2], axis=1) & np.all(
+        feature_bounds[:, 2:] <= pair_bounds[:, 2:], axis=1
+    )
+    # clip_by_rect takes one rectangle per call, so clip each tile's slice in one batch.
+    crossing = np.flatnonzero(~inside)
+    if len(crossing):
+        starts = np.flatnonzero(np.diff(tile_pos[crossing], prepend=-1))
+        for run in np.split(crossing, starts[1:]):
+            clipped[run] = shapely.clip_by_rect(clipped[run], *tile_bounds[tile_pos[run[0]]])
+        collections = crossing[shapely.get_type_id(clipped[crossing]) == 7]
+        for idx in collections:
+            clipped[idx] = _keep_dimension(clipped[idx], dimensions[idx])
+    nonempty = ~shapely.is_empty(clipped)
+    return tile_pos[nonempty], feature_idx[nonempty], clipped[nonempty]
+
 
-def _geometry_to_geojson_dict(geom):
-    """Return a GeoJSON-like dict with lists instead of tuples."""
-    return json.loads(json.dumps(mapping(geom)))
+def _ancestor(tile_id: Tuple[int, int, int], zoom: int) -> Tuple[int, int, int]:
+    """The tile at ``zoom`` containing ``tile_id`` (``tile_id`` itself at its own zoom)."""
+    z, x, y = tile_id
+    shift = z - zoom
+    return zoom, x >> shift, y >> shift
+
+
+def _keep_dimension(geom: "BaseGeometry", dimension: int) -> "BaseGeometry":
+    """Drop lower-dimensional debris (edges, corners) that clipping can leave behind."""
+    if geom.geom_type != "GeometryCollection":
+        return geom
+    parts = [part for part in shapely.get_parts(geom) if shapely.get_dimensions(part) == dimension]
+    if not parts:
+        return shapely.geometrycollections([])
+    return parts[0] if len(parts) == 1 else shapely.union_all(parts)
+
+
+@dataclass
+class _EncodedTile:
+    tile_id: Tuple[int, int, int]
+    data: bytes | None
+    dropped: int = 0
+    tile_hash: str = ""
+    seconds: float = 0.0
+    # Progress units the tile accounts for: 1, or its (tile, feature) pairs in spooled builds.
+    weight: int = 1
 
 
 @dataclass
-class _LayerFeature:
-    geometry: "BaseGeometry"
-    properties: dict
+class _Checkpoint:
+    """Marker in the encoded tile stream: every tile of ``block`` has been yielded."""
+
+    block: int
+    first_tile: Tuple[int, int, int]
+    last_tile: Tuple[int, int, int]
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+
+def _value_key(value):
+    """Dictionary key for a property value; keeps ``1``, ``1.0`` and ``True`` apart."""
+    if type(value) is str:
+        return value
+    try:
+        hash(value)
+    except TypeError:
+        return type(value), json.dumps(value, sort_keys=True, default=str)
+    return type(value), value
+
+
+class _PropertyColumns:
+    """Feature properties stored column-wise with dictionary-encoded values.
+
+    Each field keeps an int32 code per feature (``-1`` when the feature lacks the field)
+    and a table of its distinct values, so a repeated tag such as ``fclass`` costs four
+    bytes per feature instead of a dict entry.
+    """
+
+    def __init__(self) -> None:
+        self.fields: list[str] = []
+        self._codes: dict[str, array | np.ndarray] = {}
+        self._values: dict[str, list] = {}
+        self._lookup: dict[str, dict] = {}
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def append(self, properties: Mapping) -> None:
+        row = self._rows
+        for key, value in properties.items():
+            codes = self._codes.get(key)
+            if codes is None:
+                self.fields.append(key)
+                codes = self._codes[key] = array("i")
+                self._values[key] = []
+                self._lookup[key] = {}
+            lookup = self._lookup[key]
+            value_key = _value_key(value)
+            code = lookup.get(value_key)
+            if code is None:
+                code = lookup[value_key] = len(self._values[key])
+                self._values[key].append(value)
+            if len(codes) < row:
+                codes.extend([-1] * (row - len(codes)))
+            codes.append(code)
+        self._rows += 1
+
+    def finalize(self) -> None:
+        """Freeze the columns as full-length NumPy arrays and drop the lookup tables."""
+        for key, codes in self._codes.items():
+            column = np.full(self._rows, -1, dtype=np.int32)
+            column[:len(codes)] = np.frombuffer(codes, dtype=np.intc)
+            self._codes[key] = column
+        self._lookup = {}
+
+    def row(self, index: int, fields: Iterable[str] | None = None) -> dict:
+        """Rebuild the properties of feature ``index``, optionally limited to ``fields``."""
+        selected = self.fields if fields is None else [key for key in self.fields if key in fields]
+        properties = {}
+        for key in selected:
+            code = self._codes[key][index]
+            if code >= 0:
+                properties[key] = self._values[key][code]
+        return properties
+
+    def column(self, key: str, index: np.ndarray) -> Tuple[np.ndarray, list]:
+        """Codes of field ``key`` for rows ``index`` (``-1`` when missing) and its value table."""
+        codes = self._codes.get(key)
+        if codes is None:
+            return np.full(len(index), -1, dtype=np.int32), []
+        return codes[index], self._values[key]
 
 
 class GeoJSONLayerIndex:
-    """Spatial index wrapper around a GeoJSON file."""
+    """Spatial index wrapper around a GeoJSON (or newline-delimited GeoJSON) file.
+
+    The file is streamed feature by feature, so peak memory stays close to the size of
+    the finished index.
+
+    Features are held column-wise: a shapely geometry array projected to Web Mercator
+    once at load time, NumPy arrays for dimensions, sizes and bounds, and dictionary-
+    encoded property columns. ``bounds`` and ``iter_bounds`` stay in lon/lat.
+    """
 
     def __init__(self, name: str, path: Path):
         self.name = name
         self.path = Path(path)
-        self.features: List[_LayerFeature] = []
+        self.columns = _PropertyColumns()
         self._tree: STRtree | None = None
-        self._geoms: list | None = None
-        self._geom_id_map: dict[int, int] = {}
-        self._fields: set[str] = set()
+        self._geoms: np.ndarray | None = None
+        self._dimensions: np.ndarray | None = None
+        self._sizes: np.ndarray | None = None
+        self._mercator_bounds: np.ndarray | None = None
+        self._lonlat_bounds: np.ndarray | None = None
+        self._points: np.ndarray | None = None
         self.bounds: tuple[float, float, float, float] | None = None
         self._load()
 
-    def _load(self) -> None:
+    def __len__(self) -> int:
+        return 0 if self._geoms is None else len(self._geoms)
+
+    def __getstate__(self) -> dict:
+        # The STRtree is rebuilt on unpickling, which is cheaper than serializing it.
+        state = self.__dict__.copy()
+        state["_tree"] = None
+        state["_points"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._geoms is not None:
+            self._tree = STRtree(self._geoms)
+
+    def _load(self, batch_size: int = 8192) -> None:
         if not self.path.exists():
             return
-        data = json.loads(self.path.read_text(encoding="utf-8"))
-        geoms = []
-        for feature in data.get("features", []):
+        lonlat_bounds: list[np.ndarray] = []
+        projected: list[np.ndarray] = []
+        batch = []
+        for feature in iter_features(self.path):
             geom_payload = feature.get("geometry")
             if not geom_payload:
                 continue
             geom = shape(geom_payload)
             if geom.is_empty:
                 continue
-            properties = feature.get("properties") or {}
-            self._fields.update(properties.keys())
-            geoms.append(geom)
-            self.features.append(_LayerFeature(geometry=geom, properties=properties))
-        if geoms:
-            self._geoms = geoms
-            self._geom_id_map = {id(geom): idx for idx, geom in enumerate(geoms)}
-            self._tree = STRtree(geoms)
-            self.bounds = self._compute_bounds(geoms)
+            batch.append(geom)
+            self.columns.append(feature.get("properties") or {})
+            if len(batch) >= batch_size:
+                self._project_batch(batch, lonlat_bounds, projected)
+                batch = []
+        if batch:
+            self._project_batch(batch, lonlat_bounds, projected)
+        self._finalize(lonlat_bounds, projected)
 
     @staticmethod
-    def _compute_bounds(geoms: Sequence["BaseGeometry"]) -> tuple[float, float, float, float]:
-        minx, miny, maxx, maxy = geoms[0].bounds
-        for geom in geoms[1:]:
-            gx1, gy1, gx2, gy2 = geom.bounds
-            minx = min(minx, gx1)
-            miny = min(miny, gy1)
-            maxx = max(maxx, gx2)
-            maxy = max(maxy, gy2)
-        return (minx, miny, maxx, maxy)
+    def _project_batch(batch: list, lonlat_bounds: list[np.ndarray], projected: list[np.ndarray]) -> None:
+        """Project a batch right away so the lon/lat geometries can be released."""
+        lonlat = np.array(batch, dtype=object)
+        lonlat_bounds.append(shapely.bounds(lonlat))
+        projected.append(_to_web_mercator(lonlat))
+
+    def _finalize(self, lonlat_bounds: list[np.ndarray], projected: list[np.ndarray]) -> None:
+        """Build the size and bounds arrays and the spatial index."""
+        self.columns.finalize()
+        if not projected:
+            return
+        self._lonlat_bounds = np.concatenate(lonlat_bounds)
+        self.bounds = (
+            *self._lonlat_bounds[:, :2].min(axis=0).tolist(),
+            *self._lonlat_bounds[:, 2:].max(axis=0).tolist(),
+        )
+        self._geoms = np.concatenate(projected)
+        self._dimensions, self._sizes = _geometry_columns(self._geoms)
+        self._mercator_bounds = shapely.bounds(self._geoms)
+        self._tree = STRtree(self._geoms)
 
     def iter_geometries(self) -> Iterable["BaseGeometry"]:
-        for feature in self.features:
-            yield feature.geometry
+        """Yield the Web Mercator geometries."""
+        return iter(()) if self._geoms is None else iter(self._geoms)
+
+    def iter_bounds(self) -> Iterable[tuple[float, float, float, float]]:
+        """Yield the lon/lat bounds of every feature."""
+        if self._lonlat_bounds is None:
+            return iter(())
+        return map(tuple, self._lonlat_bounds.tolist())
+
+    def properties(self, index: int, fields: Iterable[str] | None = None) -> dict:
+        return self.columns.row(index, fields)
+
+    def class_values(self, field: str, feature_idx: np.ndarray) -> Tuple[np.ndarray, list]:
+        return self.columns.column(field, feature_idx)
+
+    def representative_points(self, feature_idx: np.ndarray) -> np.ndarray:
+        """A point on each feature's full geometry (computed for the whole layer once)."""
+        if self._points is None:
+            self._points = shapely.point_on_surface(self._geoms)
+        return self._points[feature_idx]
+
+    def feature_hashes(self) -> list[Tuple[str, tuple[float, float, float, float]]]:
+        """Return a content hash and the bounds of every feature."""
+        if self._geoms is None:
+            return []
+        hashes = []
+        wkbs = shapely.to_wkb(self._geoms)
+        for index, (wkb, bounds) in enumerate(zip(wkbs, self.iter_bounds())):
+            digest = hashlib.md5(wkb, usedforsecurity=False)
+            digest.update(json.dumps(self.properties(index), sort_keys=True, default=str).encode("utf-8"))
+            hashes.append((digest.hexdigest(), bounds))
+        return hashes
 
     def field_map(self) -> dict[str, str]:
-        return {field: "String" for field in sorted(self._fields)}
+        return {field: "String" for field in sorted(self.columns.fields)}
 
-    def query(self, tile_bounds) -> list[Tuple["BaseGeometry", dict]]:
+    def query(
+        self,
+        tile_bounds,
+        min_area: float = 0.0,
+        min_length: float = 0.0,
+    ) -> list[Tuple["BaseGeometry", dict]]:
+        """Return features clipped to a single ``tile_bounds`` box (see ``query_many``)."""
         if not self._tree:
             return []
-        geoms = self._geoms or []
-        results = []
-        try:
-            hit_indexes = self._tree.query(tile_bounds, return_geometries=False)  # shapely >= 2.0.1
-        except TypeError:
-            raw_hits = list(self._tree.query(tile_bounds))
-            if raw_hits and isinstance(raw_hits[0], Integral):  # shapely 2.0.x default behaviour
-                hit_indexes = raw_hits
-            else:
-                hit_indexes = []
-                for geom in raw_hits:
-                    idx = self._geom_id_map.get(id(geom))
-                    if idx is not None:
-                        hit_indexes.append(idx)
-        for idx in hit_indexes:
-            if idx >= len(self.features):
-                continue
-            props = self.features[idx].properties
-            geom = geoms[idx]
-            clipped = geom.intersection(tile_bounds)
-            if clipped.is_empty:
-                continue
-            results.append((clipped, props))
-        return results
+        _, feature_indexes, clipped = self.query_many(
+            np.array([shapely.bounds(tile_bounds)]), min_area=min_area, min_length=min_length
+        )
+        return [
+            (geom, self.properties(idx))
+            for idx, geom in zip(feature_indexes.tolist(), clipped)
+        ]
+
+    def query_many(
+        self,
+        tile_bounds: np.ndarray,
+        min_area: float = 0.0,
+        min_length: float = 0.0,
+        clip: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Assign features to a block of tiles and clip them in bulk.
+
+        ``tile_bounds`` is an (n, 4) array of Web Mercator tile bounds. Returns parallel
+        arrays of tile positions, feature indexes and clipped geometries, ordered by tile
+        and then by file order so a tile's bytes only change when its features do.
+        Polygons smaller than ``min_area`` and lines shorter than ``min_length`` (measured
+        on the unclipped geometry) are skipped before clipping. With ``clip`` off the full
+        geometries of the intersecting features are returned.
+        """
+        empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=object))
+        if not self._tree or not len(tile_bounds):
+            return empty
+        boxes = shapely.box(tile_bounds[:, 0], tile_bounds[:, 1], tile_bounds[:, 2], tile_bounds[:, 3])
+        tile_pos, feature_idx = self._tree.query(boxes, predicate="intersects")
+        keep = self.large_enough(feature_idx, min_area, min_length)
+        tile_pos, feature_idx = tile_pos[keep], feature_idx[keep]
+        order = np.lexsort((feature_idx, tile_pos))
+        tile_pos, feature_idx = tile_pos[order], feature_idx[order]
+        if not len(tile_pos):
+            return empty
+        if not clip:
+            return tile_pos, feature_idx, self._geoms[feature_idx]
+        return _clip_pairs(
+            tile_pos,
+            feature_idx,
+            self._geoms[feature_idx],
+            self._mercator_bounds[feature_idx],
+            tile_bounds,
+            self._dimensions[feature_idx],
+        )
+
+    def clip_features(
+        self,
+        feature_idx: np.ndarray,
+        geoms: np.ndarray,
+        tile_bounds: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Clip already assigned features (a parent tile's clipped set) to one tile box.
+
+        ``tile_bounds`` is a single (left, bottom, right, top) row that lies inside the box
+        ``geoms`` were clipped to, so the result matches clipping the originals directly.
+        """
+        if not len(geoms):
+            return feature_idx, geoms
+        bounds = shapely.bounds(geoms)
+        touching = (
+            (bounds[:, 0] <= tile_bounds[2]) & (bounds[:, 2] >= tile_bounds[0])
+            & (bounds[:, 1] <= tile_bounds[3]) & (bounds[:, 3] >= tile_bounds[1])
+        )
+        feature_idx = feature_idx[touching]
+        _, feature_idx, geoms = _clip_pairs(
+            np.zeros(len(feature_idx), dtype=np.intp),
+            feature_idx,
+            geoms[touching],
+            bounds[touching],
+            tile_bounds.reshape(1, 4),
+            self._dimensions[feature_idx],
+        )
+        return feature_idx, geoms
+
+    def large_enough(self, feature_idx: np.ndarray, min_area: float, min_length: float) -> np.ndarray:
+        """Mask of features whose unclipped area (polygons) or length (lines) passes the minimum."""
+        dimensions, sizes = self._dimensions[feature_idx], self._sizes[feature_idx]
+        return ~(((dimensions == 2) & (sizes < min_area)) | ((dimensions == 1) & (sizes < min_length)))
+
+
+_WORKER_STATE: dict = {}
+
+
+def _init_encode_worker(builder: "VectorMBTilesBuilder", layers: Sequence[GeoJSONLayerIndex]) -> None:
+    """Keep the layer indexes handed over by the parent (inherited as-is under fork)."""
+    _WORKER_STATE["builder"] = builder
+    _WORKER_STATE["layers"] = layers
+
+
+def _encode_shard(block: Tuple[int, Sequence[Tuple[int, int, int]]]) -> Tuple[int, list[_EncodedTile]]:
+    builder: VectorMBTilesBuilder = _WORKER_STATE["builder"]
+    index, tile_ids = block
+    return index, builder._render_block(tile_ids, _WORKER_STATE["layers"])
+
+
+def _encode_spooled_shard(block: Tuple[int, list, list]) -> Tuple[int, list[_EncodedTile]]:
+    builder: VectorMBTilesBuilder = _WORKER_STATE["builder"]
+    index, tile_ids, payload = block
+    return index, builder._render_spooled(tile_ids, payload)
+
+
+class _TileCounter:
+    """Counts features per tile key; stands in for ``SortedRuns`` in ``_spool_pairs``."""
+
+    # Most pairs ``_spool_pairs`` expands for one ``add`` call.
+    run_size = 1_000_000
+
+    def __init__(self):
+        self._keys: list[np.ndarray] = []
+        self._counts: list[np.ndarray] = []
+
+    def add(self, keys: np.ndarray, refs: np.ndarray) -> None:
+        """Count ``keys``; ``refs`` is part of the ``SortedRuns.add`` signature and unused."""
+        keys, counts = np.unique(keys, return_counts=True)
+        self._keys.append(keys)
+        self._counts.append(counts)
+
+    def counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._keys:
+            return np.empty(0, dtype=np.uint64), np.empty(0)
+        keys, inverse = np.unique(np.concatenate(self._keys), return_inverse=True)
+        return keys, np.bincount(inverse, weights=np.concatenate(self._counts))
+
+
+class _SpooledLayer:
+    """What an out-of-core build keeps per layer: name, field order, bounds and count."""
+
+    def __init__(self, name: str, number: int):
+        self.name = name
+        self.number = number
+        self.fields: list[str] = []
+        self._known: set[str] = set()
+        self.bounds: tuple[float, float, float, float] | None = None
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, properties: Mapping, lonlat_bounds: np.ndarray) -> None:
+        self.count += 1
+        for key in properties:
+            if key not in self._known:
+                self._known.add(key)
+                self.fields.append(key)
+        west, south, east, north = lonlat_bounds.tolist()
+        if self.bounds:
+            west, south = min(west, self.bounds[0]), min(south, self.bounds[1])
+            east, north = max(east, self.bounds[2]), max(north, self.bounds[3])
+        self.bounds = (west, south, east, north)
+
+    def field_map(self) -> dict[str, str]:
+        return {field: "String" for field in sorted(self.fields)}
+
+
+class _BlockLayer:
+    """One layer's features in a spooled block: properties in the layer's field order
+    and the full geometries."""
+
+    def __init__(self, name: str, fields: Sequence[str], rows: Sequence[dict], geoms: np.ndarray):
+        self.name = name
+        self.fields = fields
+        self.rows = rows
+        self.geoms = geoms
+
+    def properties(self, index: int, fields: Iterable[str] | None = None) -> dict:
+        row = self.rows[index]
+        return {key: row[key] for key in self.fields if key in row and (fields is None or key in fields)}
+
+    def class_values(self, field: str, feature_idx: np.ndarray) -> Tuple[np.ndarray, list]:
+        values: list = []
+        lookup: dict = {}
+        codes = np.full(len(feature_idx), -1, dtype=np.int32)
+        for position, index in enumerate(feature_idx.tolist()):
+            row = self.rows[index]
+            if field in row:
+                key = _value_key(row[field])
+                if key not in lookup:
+                    lookup[key] = len(values)
+                    values.append(row[field])
+                codes[position] = lookup[key]
+        return codes, values
+
+    def representative_points(self, feature_idx: np.ndarray) -> np.ndarray:
+        return shapely.point_on_surface(self.geoms[feature_idx])
+
+
+def _pack_tile_keys(zoom: int, columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Sortable 64-bit tile keys: zoom, then column, then row (like sorted ``(z, x, y)``)."""
+    return (np.uint64(zoom) << np.uint64(58)) | (columns.astype(np.uint64) << np.uint64(29)) | rows.astype(np.uint64)
+
+
+def _unpack_tile_key(key: int) -> Tuple[int, int, int]:
+    return key >> 58, (key >> 29) & 0x1FFFFFFF, key & 0x1FFFFFFF
+
+
+def _hilbert_tile_keys(zoom: int, columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Vectorized ``zxy_to_tileid`` for tiles of one zoom (XYZ rows)."""
+    x = columns.astype(np.int64)
+    y = rows.astype(np.int64)
+    keys = np.full(len(x), ((1 << (2 * zoom)) - 1) // 3, dtype=np.int64)
+    n = 1 << zoom
+    s = n >> 1
+    while s:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry)
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return keys.astype(np.uint64)
 
 
 class VectorMBTilesBuilder:
     """Create vector MBTiles directly from GeoJSON layers."""
 
-    def __init__(self, output_path: Path, min_zoom: int = 5, max_zoom: int = 12):
+    def __init__(
+        self,
+        output_path: Path,
+        min_zoom: int = 5,
+        max_zoom: int = 12,
+        workers: int = 1,
+        chunk_size: int = 64,
+        subtree_depth: int = 3,
+        bulk_load: bool = True,
+        batch_size: int = 512,
+        page_size: int = 4096,
+        vacuum: bool = False,
+        compression_level: int | None = 6,
+        simplify_pixels: float = 1.0,
+        min_feature_pixels: float = 1.0,
+        attribute_zoom: int | None = None,
+        low_zoom_attributes: Sequence[str] = ("fclass",),
+        max_tile_bytes: int | None = 500_000,
+        max_tile_features: int | None = 200_000,
+        layer_importance: Mapping[str, int] | None = None,
+        layer_zooms: Mapping[str, Tuple[int | None, int | None]] | None = None,
+        fingerprint_max_vertices: int = 512,
+        fingerprint_cache_size: int = 10_000,
+        checkpoint_blocks: int = 64,
+        stats_top_n: int = 10,
+        external_memory: bool = False,
+        spool_run_pairs: int = 4_000_000,
+        hilbert_layout: bool = False,
+        layer_aggregates: Mapping[str, Tuple[int, str]] | None = None,
+        aggregate_cells: int = 16,
+        aggregate_field: str = "fclass",
+    ):
         if min_zoom > max_zoom:
             raise ValueError("min_zoom must be <= max_zoom")
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if compression_level is not None and not 0 <= compression_level <= 9:
+            raise ValueError("compression_level must be between 0 and 9")
+        for name, (_, mode) in (layer_aggregates or {}).items():
+            if mode not in AGGREGATE_MODES:
+                raise ValueError(f"Aggregate mode of layer {name!r} must be one of {', '.join(AGGREGATE_MODES)}")
         self.output_path = Path(output_path)
         self.min_zoom = min_zoom
         self.max_zoom = max_zoom
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.subtree_depth = max(0, subtree_depth)
+        self.bulk_load = bulk_load
+        self.batch_size = max(1, batch_size)
+        self.page_size = page_size
+        self.vacuum = vacuum
+        self.compression_level = compression_level or None
+        self.simplify_pixels = simplify_pixels
+        self.min_feature_pixels = min_feature_pixels
+        self.attribute_zoom = attribute_zoom
+        self.low_zoom_attributes = frozenset(low_zoom_attributes)
+        self.max_tile_bytes = max_tile_bytes
+        self.max_tile_features = max_tile_features
+        self.layer_importance = dict(layer_importance or {})
+        self.layer_zooms = dict(layer_zooms or {})
+        self.fingerprint_max_vertices = fingerprint_max_vertices
+        self.fingerprint_cache_size = fingerprint_cache_size
+        self._fingerprints: dict[bytes, _EncodedTile] = {}
+        self.checkpoint_blocks = max(0, checkpoint_blocks)
+        self.stats_top_n = max(0, stats_top_n)
+        self.external_memory = external_memory
+        self.spool_run_pairs = max(1, spool_run_pairs)
+        self.hilbert_layout = hilbert_layout
+        # Layer name -> (zoom, mode): below that zoom the layer's features are replaced
+        # by aggregates (see ``_aggregate_features``).
+        self.layer_aggregates = {name: (int(zoom), mode) for name, (zoom, mode) in (layer_aggregates or {}).items()}
+        self.aggregate_cells = max(1, aggregate_cells)
+        self.aggregate_field = aggregate_field
 
-    def build(self, layers: Sequence[Tuple[str, str]]) -> dict:
-        layer_indexes = [
-            GeoJSONLayerIndex(name, Path(path))
-            for name, path in layers
-        ]
-        valid_layers = [layer for layer in layer_indexes if layer.features]
+    def build(
+        self,
+        layers: Sequence[Tuple[str, str]],
+        progress_callback: Callable[[float, str], None] | None = None,
+    ) -> dict:
+        """Build the tileset into a staging sibling and atomically publish it.
+
+        The previous output stays in place (and servable) until the new file is complete;
+        a failed build leaves it untouched.
+
+        With ``checkpoint_blocks`` set, tiles are committed every that many blocks of
+        ``chunk_size`` tiles together with the list of finished blocks (``build_blocks``).
+        If the staging file holds an unfinished build whose input and settings hash
+        matches, only the missing blocks are encoded; otherwise it is rebuilt from scratch.
+
+        With ``external_memory`` the layers are not loaded; see ``_build_external``.
+        """
+        if self.external_memory:
+            return self._build_external(layers, progress_callback)
+        valid_layers = self._load_layers(layers)
         if not valid_layers:
             raise ValueError("No GeoJSON layers contained features.")
         bounds = self._combined_bounds(valid_layers)
         if not bounds:
             raise ValueError("Unable to determine dataset bounds.")
 
-        if self.output_path.exists():
-            self._safe_unlink()
+        build_key = self._build_key(layers)
+        staging = staging_path(self.output_path)
+        done_blocks = self._resumable_blocks(staging, build_key)
+        if done_blocks is None:
+            remove_sqlite_file(staging)
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with sqlite3.connect(self.output_path) as conn:
-            self._initialize_db(conn)
+        conn = sqlite3.connect(staging)
+        try:
+            if self.bulk_load:
+                self._apply_bulk_pragmas(conn)
+            if done_blocks is None:
+                done_blocks = set()
+                self._initialize_db(conn, create_index=not self.bulk_load)
+                self._write_metadata(conn, bounds, valid_layers)
+                self._write_feature_index(conn, valid_layers)
+                self._start_build_state(conn, build_key)
+            else:
+                print(f"[VectorMBTilesBuilder] Resuming build, {len(done_blocks)} blocks already done.", flush=True)
+            tile_ids = self._collect_candidate_tiles(valid_layers)
+            blocks = [
+                (index, block)
+                for index, block in enumerate(self._plan_blocks(tile_ids))
+                if index not in done_blocks
+            ]
+            encoded_tiles = self._with_checkpoints(self._encode_blocks(blocks, valid_layers))
+            previous_tiles = conn.execute("SELECT COUNT(*) FROM map").fetchone()[0]
+            write_stats = self._write_tiles(
+                conn,
+                encoded_tiles,
+                sum(len(block) for _, block in blocks),
+                progress_callback,
+                seen_hashes={row[0] for row in conn.execute("SELECT tile_id FROM images")},
+            )
+            write_stats["tiles_written"] += previous_tiles
+            self._finish_build_state(conn)
+            if self.bulk_load:
+                self._finalize_bulk_load(conn)
+        finally:
+            conn.close()
+        publish_file(staging, self.output_path)
+        return {"bounds": bounds, **write_stats}
+
+    def update(
+        self,
+        layers: Sequence[Tuple[str, str]],
+        progress_callback: Callable[[float, str], None] | None = None,
+    ) -> dict:
+        """Re-encode only the tiles touched by features that changed since the last build.
+
+        Feature hashes recorded by the previous build are diffed against ``layers``; every
+        tile (at every zoom) whose bounds touch an added or removed feature is re-encoded
+        and upserted, other tiles stay in place. The live file is modified in place, but
+        only inside one SQLite transaction, so a server reading it never sees a partial
+        update; the cost is that of the changed tiles, not of the file. The file is first
+        marked as updated in place (``UPDATED_IN_PLACE_TABLE``) while readers in this
+        process are released, so they reopen it without ``immutable``. Falls back to a
+        full build when there is no previous output or it was built with different
+        settings.
+        """
+        previous = self._read_feature_index()
+        if previous is None:
+            print("[VectorMBTilesBuilder] No compatible previous build, running a full build.", flush=True)
+            return self.build(layers, progress_callback=progress_callback)
+        valid_layers = self._load_layers(layers)
+        if not valid_layers:
+            raise ValueError("No GeoJSON layers contained features.")
+        bounds = self._combined_bounds(valid_layers)
+
+        changed_bounds = []
+        tile_keys: set[Tuple[int, int, int]] = set()
+        for layer in valid_layers:
+            current = dict(layer.feature_hashes())
+            recorded = previous.pop(layer.name, {})
+            changed = [current[key] for key in current.keys() - recorded.keys()]
+            changed.extend(recorded[key] for key in recorded.keys() - current.keys())
+            tile_keys.update(self._tiles_for_bounds(changed, *self._layer_zoom_range(layer.name)))
+            changed_bounds.extend(changed)
+        for name, recorded in previous.items():
+            tile_keys.update(self._tiles_for_bounds(recorded.values(), *self._layer_zoom_range(name)))
+            changed_bounds.extend(recorded.values())
+        tile_ids = self._ordered(tile_keys)
+        print(
+            f"[VectorMBTilesBuilder] {len(changed_bounds)} changed features touch {len(tile_ids)} tiles.",
+            flush=True,
+        )
+
+        self._mark_updated_in_place()
+        conn = sqlite3.connect(self.output_path)
+        try:
+            if tile_ids:
+                blocks = list(enumerate(self._plan_blocks(tile_ids)))
+                encoded_tiles = (
+                    tile for _, block in self._encode_blocks(blocks, valid_layers) for tile in block
+                )
+                conn.executemany(
+                    "DELETE FROM map WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    [self._map_row(tile_id, "")[:3] for tile_id in tile_ids],
+                )
+                write_stats = self._write_tiles(conn, encoded_tiles, len(tile_ids), progress_callback)
+                conn.execute("DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)")
+            else:
+                write_stats = {"tiles_written": 0, "drop_stats": {}, "encode_stats": {}, "slowest_tiles": []}
+            # The whole file's distinct tiles, as a full build reports them.
+            write_stats["unique_tiles"] = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            conn.execute("DELETE FROM metadata")
             self._write_metadata(conn, bounds, valid_layers)
-            tile_count = 0
-            for tile_id in self._collect_candidate_tiles(valid_layers):
-                tile = mercantile.Tile(x=tile_id[1], y=tile_id[2], z=tile_id[0])
-                encoded = self._encode_tile(tile, valid_layers)
-                if encoded:
-                    self._insert_tile(conn, tile, encoded)
-                    tile_count += 1
+            conn.execute(f"INSERT INTO {UPDATED_IN_PLACE_TABLE} (updated_at) VALUES (?)", (time.time(),))
+            self._write_feature_index(conn, valid_layers)
             conn.commit()
+        finally:
+            conn.close()
         return {
             "bounds": bounds,
-            "tiles_written": tile_count,
+            **write_stats,
+            "incremental": True,
+            "changed_features": len(changed_bounds),
+            "tiles_updated": len(tile_ids),
         }
 
-    def _safe_unlink(self, retries: int = 20, delay: float = 0.5) -> None:
-        for attempt in range(retries):
+    def count_tiles(self, layer: GeoJSONLayerIndex, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Tile keys ``layer`` touches at ``zoom`` and the number of its features in each.
+
+        Applies the layer's zoom range and the per-zoom size filter of a build, and counts
+        a feature in every tile its bounding box touches; ``tile_from_key`` turns the keys
+        into tile ids. Nothing is clipped or encoded.
+        """
+        counter = _TileCounter()
+        min_zoom, max_zoom = self._layer_zoom_range(layer.name)
+        if len(layer) and min_zoom <= zoom <= max_zoom:
+            mercator_bounds = shapely.bounds(np.array(list(layer.iter_geometries()), dtype=object)).reshape(-1, 4)
+            feature_idx = np.arange(len(layer))
+            keep = layer.large_enough(feature_idx, *self._size_limits(layer.name, zoom))
+            self._spool_pairs(counter, zoom, mercator_bounds[keep], feature_idx[keep])
+        return counter.counts()
+
+    def tile_from_key(self, key: int) -> Tuple[int, int, int]:
+        """Tile id of a key from ``count_tiles`` (or the sort keys of out-of-core builds)."""
+        return tileid_to_zxy(key) if self.hilbert_layout else _unpack_tile_key(key)
+
+    def encode_tiles(
+        self,
+        tile_ids: Sequence[Tuple[int, int, int]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> list[Tuple[Tuple[int, int, int], bytes | None]]:
+        """``(tile id, encoded bytes or None if empty)`` of ``tile_ids`` from ``layers``,
+        clipped and encoded exactly as a build would, without writing anything.
+
+        Every call starts with an empty fingerprint cache, so no encoding is reused from
+        an earlier call and separate calls cost what they would in their own build.
+        """
+        self._fingerprints.clear()
+        return [(tile.tile_id, tile.data) for tile in self._render_block(tile_ids, layers)]
+
+    def _mark_updated_in_place(self) -> None:
+        """Record that the live file is written in place from now on.
+
+        Readers may only open files that are never modified as immutable. The marker is
+        committed while registered readers hold no handle on the file (``released``), so
+        they reopen it in plain read-only mode before the first change.
+        """
+        with released(self.output_path):
+            conn = sqlite3.connect(self.output_path)
             try:
-                self.output_path.unlink()
-                return
-            except FileNotFoundError:
-                return
-            except PermissionError:
-                if attempt == retries - 1:
-                    raise
-                time.sleep(delay)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {UPDATED_IN_PLACE_TABLE} (updated_at REAL)")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _settings(self) -> dict:
+        """Options that affect tile contents or the file layout; an incremental update requires them to match."""
+        return {
+            "min_zoom": self.min_zoom,
+            "max_zoom": self.max_zoom,
+            "compression_level": self.compression_level,
+            "simplify_pixels": self.simplify_pixels,
+            "min_feature_pixels": self.min_feature_pixels,
+            "attribute_zoom": self.attribute_zoom,
+            "low_zoom_attributes": sorted(self.low_zoom_attributes),
+            "max_tile_bytes": self.max_tile_bytes,
+            "max_tile_features": self.max_tile_features,
+            "layer_importance": dict(sorted(self.layer_importance.items())),
+            "layer_zooms": {name: list(zooms) for name, zooms in sorted(self.layer_zooms.items())},
+            "geometry_encoding": "web-mercator",
+            "tile_layout": "hilbert" if self.hilbert_layout else "zxy",
+            "layer_aggregates": {name: list(value) for name, value in sorted(self.layer_aggregates.items())},
+            "aggregate_cells": self.aggregate_cells,
+            "aggregate_field": self.aggregate_field,
+        }
+
+    def _write_feature_index(self, conn: sqlite3.Connection, layers: Sequence[GeoJSONLayerIndex]) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feature_index (
+                layer TEXT,
+                feature_hash TEXT,
+                west REAL,
+                south REAL,
+                east REAL,
+                north REAL
+            )
+            """
+        )
+        conn.execute("DELETE FROM feature_index")
+        for layer in layers:
+            conn.executemany(
+                "INSERT INTO feature_index (layer, feature_hash, west, south, east, north) VALUES (?, ?, ?, ?, ?, ?)",
+                ((layer.name, feature_hash, *bounds) for feature_hash, bounds in layer.feature_hashes()),
+            )
+        conn.commit()
+
+    def _read_feature_index(self) -> dict[str, dict[str, tuple]] | None:
+        """Return ``{layer: {feature_hash: bounds}}`` from a compatible previous build."""
+        if not self.output_path.exists():
+            return None
+        conn = sqlite3.connect(self.output_path)
+        try:
+            row = conn.execute("SELECT value FROM metadata WHERE name = 'builder_settings'").fetchone()
+            if not row or json.loads(row[0]) != json.loads(json.dumps(self._settings())):
+                return None
+            recorded: dict[str, dict[str, tuple]] = {}
+            for layer, feature_hash, *bounds in conn.execute(
+                "SELECT layer, feature_hash, west, south, east, north FROM feature_index"
+            ):
+                recorded.setdefault(layer, {})[feature_hash] = tuple(bounds)
+            return recorded
+        except (sqlite3.DatabaseError, json.JSONDecodeError):
+            return None
+        finally:
+            conn.close()
+
+    def _build_external(
+        self,
+        layers: Sequence[Tuple[str, str]],
+        progress_callback: Callable[[float, str], None] | None = None,
+    ) -> dict:
+        """Out-of-core ``build`` for inputs larger than RAM.
+
+        Each layer is streamed once: features go to an on-disk spool, and one
+        ``(tile key, feature offset)`` pair per covered tile and zoom goes to sorted runs
+        of at most ``spool_run_pairs`` pairs. The runs are then merged in tile key order
+        and encoded in blocks of ``chunk_size`` same-zoom tiles, reading only that block's
+        features back. Memory stays bounded by one run plus the blocks in flight. The
+        spool lives in a temporary directory next to the output. Staging, publishing and
+        checkpoints work as in ``build``. Every tile is clipped from the full geometries,
+        so there is no parent-to-child clipping in this mode.
+        """
+        build_key = self._build_key(layers)
+        staging = staging_path(self.output_path)
+        done_blocks = self._resumable_blocks(staging, build_key)
+        if done_blocks is None:
+            remove_sqlite_file(staging)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        spool_prefix = f".{self.output_path.stem}-spool-"
+        # A killed build leaves its spool behind; it is rebuilt anyway.
+        for stale in self.output_path.parent.glob(f"{spool_prefix}*"):
+            shutil.rmtree(stale, ignore_errors=True)
+
+        with tempfile.TemporaryDirectory(prefix=spool_prefix, dir=self.output_path.parent) as spool_dir:
+            spool = FeatureSpool(Path(spool_dir) / "features.bin")
+            runs = SortedRuns(Path(spool_dir), self.spool_run_pairs)
+            conn = sqlite3.connect(staging)
+            try:
+                if self.bulk_load:
+                    self._apply_bulk_pragmas(conn)
+                fresh = done_blocks is None
+                if fresh:
+                    done_blocks = set()
+                    self._initialize_db(conn, create_index=not self.bulk_load)
+                    self._write_feature_index(conn, [])
+                if progress_callback:
+                    progress_callback(0.0, "Spooling features to disk...")
+                summaries = self._spool_layers(layers, spool, runs, conn if fresh else None)
+                spool.finish()
+                if not summaries:
+                    raise ValueError("No GeoJSON layers contained features.")
+                bounds = self._combined_bounds(summaries)
+                if fresh:
+                    conn.commit()
+                    self._write_metadata(conn, bounds, summaries)
+                    self._start_build_state(conn, build_key)
+                else:
+                    print(f"[VectorMBTilesBuilder] Resuming build, {len(done_blocks)} blocks already done.", flush=True)
+                print(
+                    f"[VectorMBTilesBuilder] Spooled {sum(map(len, summaries))} features, "
+                    f"{runs.pairs} tile pairs in {len(runs.runs) or 1} sorted runs.",
+                    flush=True,
+                )
+                encoded_tiles = self._with_checkpoints(
+                    self._encode_spooled(self._spooled_blocks(runs), spool, summaries, done_blocks)
+                )
+                previous_tiles = conn.execute("SELECT COUNT(*) FROM map").fetchone()[0]
+                write_stats = self._write_tiles(
+                    conn,
+                    encoded_tiles,
+                    runs.pairs,
+                    progress_callback,
+                    seen_hashes={row[0] for row in conn.execute("SELECT tile_id FROM images")},
+                )
+                write_stats["tiles_written"] += previous_tiles
+                self._finish_build_state(conn)
+                if self.bulk_load:
+                    self._finalize_bulk_load(conn)
+            finally:
+                conn.close()
+                spool.close()
+        publish_file(staging, self.output_path)
+        return {"bounds": bounds, **write_stats}
+
+    def _spool_layers(
+        self,
+        layers: Sequence[Tuple[str, str]],
+        spool: FeatureSpool,
+        runs: SortedRuns,
+        conn: sqlite3.Connection | None,
+        batch_size: int = 8192,
+    ) -> list[_SpooledLayer]:
+        """Stream every layer into ``spool``/``runs``; with ``conn``, also fill ``feature_index``."""
+        summaries = []
+        for number, (name, path) in enumerate(layers):
+            summary = _SpooledLayer(name, number)
+            path = Path(path)
+            if path.exists():
+                geoms, properties = [], []
+                for feature in iter_features(path):
+                    geom_payload = feature.get("geometry")
+                    if not geom_payload:
+                        continue
+                    geom = shape(geom_payload)
+                    if geom.is_empty:
+                        continue
+                    geoms.append(geom)
+                    properties.append(feature.get("properties") or {})
+                    if len(geoms) >= batch_size:
+                        self._spool_batch(number, summary, geoms, properties, spool, runs, conn)
+                        geoms, properties = [], []
+                if geoms:
+                    self._spool_batch(number, summary, geoms, properties, spool, runs, conn)
+            if len(summary):
+                summaries.append(summary)
+        return summaries
+
+    def _spool_batch(
+        self,
+        number: int,
+        summary: _SpooledLayer,
+        geoms: list,
+        properties: list[dict],
+        spool: FeatureSpool,
+        runs: SortedRuns,
+        conn: sqlite3.Connection | None,
+    ) -> None:
+        lonlat = np.array(geoms, dtype=object)
+        lonlat_bounds = shapely.bounds(lonlat)
+        projected = _to_web_mercator(lonlat)
+        dimensions, sizes = _geometry_columns(projected)
+        refs = np.empty(len(projected), dtype=np.uint64)
+        index_rows = []
+        for position, (wkb, props) in enumerate(zip(shapely.to_wkb(projected), properties)):
+            summary.add(props, lonlat_bounds[position])
+            refs[position] = spool.append(
+                number, int(dimensions[position]), float(sizes[position]), wkb, json.dumps(props).encode("utf-8")
+            )
+            if conn is not None:
+                # Same hash as GeoJSONLayerIndex.feature_hashes, so incremental updates still work.
+                digest = hashlib.md5(wkb, usedforsecurity=False)
+                digest.update(json.dumps(props, sort_keys=True, default=str).encode("utf-8"))
+                index_rows.append((summary.name, digest.hexdigest(), *lonlat_bounds[position].tolist()))
+        if index_rows:
+            conn.executemany(
+                "INSERT INTO feature_index (layer, feature_hash, west, south, east, north) VALUES (?, ?, ?, ?, ?, ?)",
+                index_rows,
+            )
+        min_zoom, max_zoom = self._layer_zoom_range(summary.name)
+        mercator_bounds = shapely.bounds(projected)
+        for zoom in range(min_zoom, max_zoom + 1):
+            min_area, min_length = self._size_limits(summary.name, zoom)
+            keep = ~(((dimensions == 2) & (sizes < min_area)) | ((dimensions == 1) & (sizes < min_length)))
+            self._spool_pairs(runs, zoom, mercator_bounds[keep], refs[keep])
+
+    def _spool_pairs(self, runs: SortedRuns, zoom: int, bounds: np.ndarray, refs: np.ndarray) -> None:
+        """Add a pair for every ``zoom`` tile each feature's Web Mercator bbox touches.
+
+        Features are expanded a slice at a time so that even a feature covering millions
+        of tiles never allocates much more than one run of pairs.
+        """
+        if not len(refs):
+            return
+        world = 2 * math.pi * EARTH_RADIUS
+        tiles = 1 << zoom
+        tile_size = world / tiles
+        columns = np.clip(np.floor((bounds[:, [0, 2]] + world / 2) / tile_size), 0, tiles - 1).astype(np.int64)
+        rows = np.clip(np.floor((world / 2 - bounds[:, [3, 1]]) / tile_size), 0, tiles - 1).astype(np.int64)
+        widths = columns[:, 1] - columns[:, 0] + 1
+        heights = rows[:, 1] - rows[:, 0] + 1
+        # Split very tall features into bands of rows, then group features into slices.
+        band = max(1, runs.run_size // int(widths.max()))
+        if heights.max() > band:
+            starts = [np.arange(row, row_end + 1, band) for row, row_end in rows]
+            owners = np.repeat(np.arange(len(refs)), [len(band_starts) for band_starts in starts])
+            band_starts = np.concatenate(starts)
+            rows = np.column_stack((band_starts, np.minimum(band_starts + band - 1, rows[owners, 1])))
+            columns, widths, refs = columns[owners], widths[owners], refs[owners]
+            heights = rows[:, 1] - rows[:, 0] + 1
+        counts = widths * heights
+        ends = np.cumsum(counts)
+        start = 0
+        while start < len(counts):
+            done = ends[start - 1] if start else 0
+            stop = max(start + 1, int(np.searchsorted(ends, done + runs.run_size, side="right")))
+            part_counts = counts[start:stop]
+            owner = np.repeat(np.arange(start, stop), part_counts)
+            offset = np.arange(len(owner)) - np.repeat(np.cumsum(part_counts) - part_counts, part_counts)
+            tile_columns = columns[owner, 0] + offset % widths[owner]
+            tile_rows = rows[owner, 0] + offset // widths[owner]
+            runs.add(self._tile_keys(zoom, tile_columns, tile_rows), refs[owner])
+            start = stop
+
+    def _spooled_blocks(self, runs: SortedRuns) -> Iterator[Tuple[int, list[Tuple[int, int, int]], list[list[int]]]]:
+        """Merge the runs and group them into ``(index, tile ids, feature offsets per tile)``
+        blocks in tile key order.
+
+        A block holds at most ``chunk_size`` same-zoom tiles and is closed early once it
+        references ``_SPOOL_BLOCK_PAIRS`` features, which bounds the features read back
+        at once (a single tile can still exceed it).
+        """
+        index = 0
+        pairs_in_block = 0
+        tile_ids: list[Tuple[int, int, int]] = []
+        tile_refs: list[list[int]] = []
+        for key, pairs in groupby(runs.merged(), key=itemgetter(0)):
+            tile_id = self.tile_from_key(key)
+            if tile_ids and (
+                len(tile_ids) >= self.chunk_size
+                or tile_id[0] != tile_ids[0][0]
+                or pairs_in_block >= _SPOOL_BLOCK_PAIRS
+            ):
+                yield index, tile_ids, tile_refs
+                index += 1
+                pairs_in_block = 0
+                tile_ids, tile_refs = [], []
+            tile_ids.append(tile_id)
+            tile_refs.append([ref for _, ref in pairs])
+            pairs_in_block += len(tile_refs[-1])
+        if tile_ids:
+            yield index, tile_ids, tile_refs
+
+    def _encode_spooled(
+        self,
+        blocks: Iterable[Tuple[int, list[Tuple[int, int, int]], list[list[int]]]],
+        spool: FeatureSpool,
+        summaries: Sequence[_SpooledLayer],
+        done_blocks: set[int],
+    ) -> Iterator[Tuple[int, list[_EncodedTile]]]:
+        """Read each pending block's features from the spool and encode it.
+
+        With several workers at most ``2 * workers`` blocks are in flight, so the parent
+        never reads far ahead of the encoders. Each tile's ``weight`` is its number of
+        (tile, feature) pairs, plus those of the finished blocks skipped before it when
+        resuming, so progress can be measured against ``runs.pairs`` without a second
+        merge pass to count the tiles.
+        """
+        weights: dict[int, list[int]] = {}
+
+        def pending_payloads():
+            skipped = 0
+            for index, tile_ids, tile_refs in blocks:
+                pairs = [len(refs) for refs in tile_refs]
+                if index in done_blocks:
+                    skipped += sum(pairs)
+                    continue
+                pairs[0] += skipped
+                skipped = 0
+                weights[index] = pairs
+                yield index, tile_ids, self._spooled_payload(spool, summaries, tile_refs)
+
+        def weighted(index: int, tiles: list[_EncodedTile]) -> Tuple[int, list[_EncodedTile]]:
+            for tile, weight in zip(tiles, weights.pop(index)):
+                tile.weight = weight
+            return index, tiles
+
+        if self.workers <= 1:
+            for index, tile_ids, payload in pending_payloads():
+                yield weighted(index, self._render_spooled(tile_ids, payload))
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with context.Pool(processes=self.workers, initializer=_init_encode_worker, initargs=(self, [])) as pool:
+            pending: deque = deque()
+            for block in pending_payloads():
+                pending.append(pool.apply_async(_encode_spooled_shard, (block,)))
+                if len(pending) >= 2 * self.workers:
+                    yield weighted(*pending.popleft().get())
+            while pending:
+                yield weighted(*pending.popleft().get())
+
+    @staticmethod
+    def _spooled_payload(
+        spool: FeatureSpool,
+        summaries: Sequence[_SpooledLayer],
+        tile_refs: Sequence[Sequence[int]],
+    ) -> list[Tuple[str, list[str], dict]]:
+        """Per-layer features of one block (WKB, raw properties, dimensions, pair arrays).
+
+        Pairs stay ordered by tile and then by spool offset, i.e. by input file order.
+        """
+        layers: dict[int, dict] = {}
+        local: dict[int, Tuple[int, int]] = {}
+        for position, refs in enumerate(tile_refs):
+            for ref in refs:
+                entry = local.get(ref)
+                if entry is None:
+                    number, dimension, _, wkb, properties = spool.read(ref)
+                    data = layers.setdefault(
+                        number, {"wkb": [], "properties": [], "dimensions": [], "tile_pos": [], "feature_idx": []}
+                    )
+                    entry = local[ref] = (number, len(data["wkb"]))
+                    data["wkb"].append(wkb)
+                    data["properties"].append(properties)
+                    data["dimensions"].append(dimension)
+                data = layers[entry[0]]
+                data["tile_pos"].append(position)
+                data["feature_idx"].append(entry[1])
+        by_number = {summary.number: summary for summary in summaries}
+        return [(by_number[number].name, by_number[number].fields, layers[number]) for number in sorted(layers)]
+
+    def _render_spooled(self, tile_ids: Sequence[Tuple[int, int, int]], payload: list) -> list[_EncodedTile]:
+        """Clip and encode a spooled block of same-zoom tiles (see ``_spooled_payload``)."""
+        started = time.perf_counter()
+        zoom = tile_ids[0][0]
+        tile_bounds = _tile_bounds_array(tile_ids)
+        clipped = []
+        for name, fields, data in payload:
+            feature_idx = np.array(data["feature_idx"], dtype=np.intp)
+            features = shapely.from_wkb(data["wkb"])
+            geoms = features[feature_idx]
+            dimensions = np.array(data["dimensions"], dtype=np.int8)[feature_idx]
+            layer = _BlockLayer(name, fields, [json.loads(row) for row in data["properties"]], features)
+            tile_pos = np.array(data["tile_pos"], dtype=np.intp)
+            if not self._needs_clipping(name, zoom):
+                clipped.append((layer, tile_pos, feature_idx, geoms))
+                continue
+            clipped.append(
+                (layer, *_clip_pairs(tile_pos, feature_idx, geoms, shapely.bounds(geoms), tile_bounds, dimensions))
+            )
+        per_tile = self._tile_features(zoom, tile_bounds, clipped)
+        shared = (time.perf_counter() - started) / len(tile_ids)
+        encoded = []
+        for tile_id, layer_features in zip(tile_ids, per_tile):
+            started = time.perf_counter()
+            tile = self._render_tile(tile_id, layer_features)
+            tile.seconds = shared + time.perf_counter() - started
+            encoded.append(tile)
+        return encoded
+
+    def _load_layers(self, layers: Sequence[Tuple[str, str]]) -> list[GeoJSONLayerIndex]:
+        layer_indexes = [
+            GeoJSONLayerIndex(name, Path(path))
+            for name, path in layers
+        ]
+        return [layer for layer in layer_indexes if len(layer)]
+
+    def _encode_blocks(
+        self,
+        blocks: Sequence[Tuple[int, Sequence[Tuple[int, int, int]]]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> Iterator[Tuple[int, list[_EncodedTile]]]:
+        """Yield ``(block index, encoded tiles)``, in a process pool when it pays off."""
+        if self.workers > 1 and len(blocks) > 1:
+            yield from self._encode_parallel(blocks, layers)
+            return
+        for index, tile_ids in blocks:
+            yield index, self._render_block(tile_ids, layers)
+
+    def _encode_parallel(
+        self,
+        blocks: Sequence[Tuple[int, Sequence[Tuple[int, int, int]]]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> Iterator[Tuple[int, list[_EncodedTile]]]:
+        """Encode blocks of neighbouring tiles in a process pool.
+
+        Workers receive the parent's columnar layer indexes (no re-parsing; under fork they
+        are not even pickled); encoded blobs are streamed back so that the calling process
+        stays the only SQLite writer. Blocks come back in completion order.
+        """
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with context.Pool(
+            processes=self.workers,
+            initializer=_init_encode_worker,
+            initargs=(self, list(layers)),
+        ) as pool:
+            yield from pool.imap_unordered(_encode_shard, blocks)
+
+    @staticmethod
+    def _with_checkpoints(
+        encoded_blocks: Iterable[Tuple[int, list[_EncodedTile]]],
+    ) -> Iterator[_EncodedTile | _Checkpoint]:
+        for index, tiles in encoded_blocks:
+            yield from tiles
+            if tiles:
+                yield _Checkpoint(index, tiles[0].tile_id, tiles[-1].tile_id)
+
+    def _build_key(self, layers: Sequence[Tuple[str, str]]) -> str:
+        """Hash of the input files, the builder settings and the block layout."""
+        digest = hashlib.sha256()
+        layout = {
+            "chunk_size": self.chunk_size,
+            "subtree_depth": self.subtree_depth,
+            "external_memory": self.external_memory,
+        }
+        digest.update(json.dumps({**self._settings(), **layout}, sort_keys=True).encode("utf-8"))
+        for name, path in layers:
+            digest.update(name.encode("utf-8") + b"\0")
+            path = Path(path)
+            if not path.exists():
+                continue
+            with path.open("rb") as handle:
+                for chunk in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def _resumable_blocks(self, staging: Path, build_key: str) -> set[int] | None:
+        """Finished blocks of an interrupted build with the same key, else ``None``."""
+        if not self.checkpoint_blocks or not staging.exists():
+            return None
+        conn = sqlite3.connect(staging)
+        try:
+            state = dict(conn.execute("SELECT name, value FROM build_state").fetchall())
+            if state.get("status") != "building" or state.get("build_key") != build_key:
+                return None
+            return {row[0] for row in conn.execute("SELECT block FROM build_blocks")}
+        except sqlite3.DatabaseError:
+            return None
+        finally:
+            conn.close()
+
+    def _start_build_state(self, conn: sqlite3.Connection, build_key: str) -> None:
+        conn.execute("CREATE TABLE IF NOT EXISTS build_state (name TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS build_blocks (
+                block INTEGER PRIMARY KEY,
+                first_zoom INTEGER, first_column INTEGER, first_row INTEGER,
+                last_zoom INTEGER, last_column INTEGER, last_row INTEGER
+            )
+            """
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO build_state (name, value) VALUES (?, ?)",
+            [("build_key", build_key), ("status", "building")],
+        )
+        conn.commit()
+
+    def _record_checkpoints(self, conn: sqlite3.Connection, checkpoints: Sequence[_Checkpoint]) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO build_blocks VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(cp.block, *cp.first_tile, *cp.last_tile) for cp in checkpoints],
+        )
+
+    @staticmethod
+    def _finish_build_state(conn: sqlite3.Connection) -> None:
+        """Drop the checkpoint tables once every tile is written."""
+        conn.execute("DROP TABLE IF EXISTS build_blocks")
+        conn.execute("DROP TABLE IF EXISTS build_state")
+        conn.commit()
 
     def _collect_candidate_tiles(self, layers: Sequence[GeoJSONLayerIndex]) -> List[Tuple[int, int, int]]:
         tile_keys: set[Tuple[int, int, int]] = set()
         for layer in layers:
-            for geom in layer.iter_geometries():
-                minx, miny, maxx, maxy = geom.bounds
-                for zoom in range(self.min_zoom, self.max_zoom + 1):
-                    for tile in mercantile.tiles(minx, miny, maxx, maxy, zoom):
-                        tile_keys.add((tile.z, tile.x, tile.y))
+            tile_keys.update(self._tiles_for_bounds(layer.iter_bounds(), *self._layer_zoom_range(layer.name)))
+        return self._ordered(tile_keys)
+
+    def _tiles_for_bounds(
+        self,
+        bounds: Iterable[tuple[float, float, float, float]],
+        min_zoom: int | None = None,
+        max_zoom: int | None = None,
+    ) -> List[Tuple[int, int, int]]:
+        min_zoom = self.min_zoom if min_zoom is None else min_zoom
+        max_zoom = self.max_zoom if max_zoom is None else max_zoom
+        tile_keys: set[Tuple[int, int, int]] = set()
+        for minx, miny, maxx, maxy in bounds:
+            for zoom in range(min_zoom, max_zoom + 1):
+                for tile in mercantile.tiles(minx, miny, maxx, maxy, zoom):
+                    tile_keys.add((tile.z, tile.x, tile.y))
         return sorted(tile_keys)
 
-    def _encode_tile(self, tile: mercantile.Tile, layers: Sequence[GeoJSONLayerIndex]) -> bytes | None:
-        bounds = mercantile.bounds(tile)
-        tile_bounds = box(bounds.west, bounds.south, bounds.east, bounds.north)
-        layer_payload = []
+    def _layer_zoom_range(self, name: str) -> Tuple[int, int]:
+        """Zoom range of layer ``name``, clamped to the builder's own range."""
+        min_zoom, max_zoom = self.layer_zooms.get(name) or (None, None)
+        min_zoom = self.min_zoom if min_zoom is None else max(min_zoom, self.min_zoom)
+        max_zoom = self.max_zoom if max_zoom is None else min(max_zoom, self.max_zoom)
+        return min_zoom, max_zoom
+
+    def _ordered(self, tile_ids: Iterable[Tuple[int, int, int]]) -> list[Tuple[int, int, int]]:
+        """``tile_ids`` in the order tiles are built and written: ``(z, x, y)``, or zoom
+        by zoom along the Hilbert curve with ``hilbert_layout`` so that neighbouring
+        tiles are stored close together."""
+        if self.hilbert_layout:
+            return sorted(tile_ids, key=lambda tile_id: zxy_to_tileid(*tile_id))
+        return sorted(tile_ids)
+
+    def _tile_keys(self, zoom: int, columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Sort keys of out-of-core builds; they order tiles like ``_ordered``
+        (``tile_from_key`` is the inverse)."""
+        if self.hilbert_layout:
+            return _hilbert_tile_keys(zoom, columns, rows)
+        return _pack_tile_keys(zoom, columns, rows)
+
+    def _subtree_zoom(self) -> int:
+        """Zoom of the subtree roots: tiles from here up are clipped parent-to-child."""
+        return max(self.min_zoom, self.max_zoom - self.subtree_depth)
+
+    def _plan_blocks(self, tile_ids: Sequence[Tuple[int, int, int]]) -> list[list[Tuple[int, int, int]]]:
+        """Split sorted ``tile_ids`` into work blocks.
+
+        Tiles below the subtree zoom form blocks of ``chunk_size`` same-zoom tiles; the
+        rest are grouped by their ancestor at the subtree zoom, one block per subtree (at
+        most ``(4 ** (subtree_depth + 1) - 1) / 3`` tiles).
+        """
+        root_zoom = self._subtree_zoom()
+        low = [tile_id for tile_id in tile_ids if tile_id[0] < root_zoom]
+        blocks = [low[start:start + self.chunk_size] for start in range(0, len(low), self.chunk_size)]
+        subtrees: dict[Tuple[int, int, int], list[Tuple[int, int, int]]] = {}
+        for tile_id in tile_ids:
+            if tile_id[0] >= root_zoom:
+                subtrees.setdefault(_ancestor(tile_id, root_zoom), []).append(tile_id)
+        blocks.extend(subtrees[root] for root in self._ordered(subtrees))
+        return blocks
+
+    def _render_block(
+        self,
+        tile_ids: Sequence[Tuple[int, int, int]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> list[_EncodedTile]:
+        """Encode a block of tiles.
+
+        Tiles below the subtree zoom are assigned and clipped in bulk per zoom; each
+        tile's ``seconds`` is its own encoding time plus an equal share of that. Tiles at
+        or above it are built depth first per subtree (see ``_render_subtree``). Works for
+        any set of tiles, so full builds and incremental updates clip identically.
+        """
+        encoded: list[_EncodedTile] = []
+        root_zoom = self._subtree_zoom()
+        for zoom in sorted({tile_id[0] for tile_id in tile_ids if tile_id[0] < root_zoom}):
+            zoom_tiles = [tile_id for tile_id in tile_ids if tile_id[0] == zoom]
+            started = time.perf_counter()
+            per_tile = self._block_features(zoom, zoom_tiles, layers)
+            shared = (time.perf_counter() - started) / len(zoom_tiles)
+            for tile_id, layer_features in zip(zoom_tiles, per_tile):
+                started = time.perf_counter()
+                tile = self._render_tile(tile_id, layer_features)
+                tile.seconds = shared + time.perf_counter() - started
+                encoded.append(tile)
+        subtrees: dict[Tuple[int, int, int], set[Tuple[int, int, int]]] = {}
+        for tile_id in tile_ids:
+            if tile_id[0] >= root_zoom:
+                subtrees.setdefault(_ancestor(tile_id, root_zoom), set()).add(tile_id)
+        for root in self._ordered(subtrees):
+            encoded.extend(self._render_subtree(root, subtrees[root], layers))
+        return encoded
+
+    def _render_subtree(
+        self,
+        root: Tuple[int, int, int],
+        targets: set[Tuple[int, int, int]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> list[_EncodedTile]:
+        """Encode ``targets`` (tiles under ``root``) depth first with parent-to-child clipping.
+
+        Only the root is clipped from the full-size geometries; every other tile clips
+        its parent's clipped features, so the cost of a large polygon shrinks with each
+        level. Only the clipped sets on the current root-to-leaf path are held in memory.
+        Ancestors that are not targets themselves are clipped but not encoded.
+        """
+        needed = set(targets)
+        for z, x, y in targets:
+            while z > root[0]:
+                z, x, y = z - 1, x // 2, y // 2
+                needed.add((z, x, y))
+        encoded: list[_EncodedTile] = []
+        self._visit_tile(root, None, layers, targets, needed, encoded)
+        encoded.sort(key=lambda tile: tile.tile_id)
+        return encoded
+
+    def _visit_tile(
+        self,
+        tile_id: Tuple[int, int, int],
+        parent: list[Tuple[GeoJSONLayerIndex, np.ndarray, np.ndarray]] | None,
+        layers: Sequence[GeoJSONLayerIndex],
+        targets: set[Tuple[int, int, int]],
+        needed: set[Tuple[int, int, int]],
+        encoded: list[_EncodedTile],
+    ) -> None:
+        started = time.perf_counter()
+        zoom = tile_id[0]
+        tile_bounds = _tile_bounds_array([tile_id])
+        clipped: list[Tuple[GeoJSONLayerIndex, np.ndarray, np.ndarray]] = []
+        if parent is None:
+            for layer in layers:
+                if self._layer_zoom_range(layer.name)[1] >= zoom:
+                    _, feature_idx, geoms = layer.query_many(tile_bounds)
+                    clipped.append((layer, feature_idx, geoms))
+        else:
+            for layer, feature_idx, geoms in parent:
+                if self._layer_zoom_range(layer.name)[1] >= zoom:
+                    clipped.append((layer, *layer.clip_features(feature_idx, geoms, tile_bounds[0])))
+        if tile_id in targets:
+            visible = []
+            for layer, feature_idx, geoms in clipped:
+                min_layer_zoom, max_layer_zoom = self._layer_zoom_range(layer.name)
+                if not min_layer_zoom <= zoom <= max_layer_zoom:
+                    continue
+                keep = layer.large_enough(feature_idx, *self._size_limits(layer.name, zoom))
+                visible.append((layer, np.zeros(int(keep.sum()), dtype=np.intp), feature_idx[keep], geoms[keep]))
+            (layer_features,) = self._tile_features(zoom, tile_bounds, visible)
+            tile = self._render_tile(tile_id, layer_features)
+            tile.seconds = time.perf_counter() - started
+            encoded.append(tile)
+        _, x, y = tile_id
+        for child in ((zoom + 1, 2 * x + dx, 2 * y + dy) for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1))):
+            if child in needed:
+                self._visit_tile(child, clipped, layers, targets, needed, encoded)
+
+    def _render_tile(
+        self,
+        tile_id: Tuple[int, int, int],
+        layer_features: list[Tuple[str, list[Tuple["BaseGeometry", dict]]]],
+    ) -> _EncodedTile:
+        """Encode ``tile_id`` within the size budget and return the bytes to store."""
+        if not layer_features:
+            return _EncodedTile(tile_id, None)
+        fingerprint = self._fingerprint(layer_features)
+        cached = self._fingerprints.get(fingerprint) if fingerprint else None
+        if cached:
+            return _EncodedTile(tile_id, cached.data, cached.dropped, cached.tile_hash)
+        data, dropped = self._encode_within_budget(layer_features)
+        encoded = _EncodedTile(tile_id, data, dropped, _content_hash(data) if data else "")
+        if fingerprint:
+            if len(self._fingerprints) >= self.fingerprint_cache_size:
+                self._fingerprints.clear()
+            self._fingerprints[fingerprint] = encoded
+        return encoded
+
+    def _fingerprint(self, layer_features: list[Tuple[str, list[Tuple["BaseGeometry", dict]]]]) -> bytes | None:
+        """Hash the clipped tile content (already in integer tile coordinates).
+
+        Tiles with the same fingerprint encode to the same bytes (for example interior
+        tiles fully covered by one landuse polygon), so their encoding can be reused.
+        Only cheap, small tiles are fingerprinted; busy tiles are practically never equal.
+        """
+        geoms = [np.array([geom for geom, _ in features], dtype=object) for _, features in layer_features]
+        if sum(int(shapely.get_num_coordinates(layer).sum()) for layer in geoms) > self.fingerprint_max_vertices:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for (name, features), layer_geoms in zip(layer_features, geoms):
+            digest.update(name.encode("utf-8"))
+            for wkb, (_, props) in zip(shapely.to_wkb(layer_geoms), features):
+                digest.update(wkb)
+                digest.update(json.dumps(props, sort_keys=True, default=str).encode("utf-8"))
+        return digest.digest()
+
+    def _block_features(
+        self,
+        zoom: int,
+        tile_ids: Sequence[Tuple[int, int, int]],
+        layers: Sequence[GeoJSONLayerIndex],
+    ) -> list[list[Tuple[str, list[Tuple["BaseGeometry", dict]]]]]:
+        """Clip, generalize and project each layer's features for same-zoom tiles.
+
+        Every step runs as one vectorized call over the whole block; only the final
+        grouping into per-tile feature lists is a Python loop.
+        """
+        tile_bounds = _tile_bounds_array(tile_ids)
+        clipped = []
         for layer in layers:
-            hits = layer.query(tile_bounds)
-            if not hits:
+            min_zoom, max_zoom = self._layer_zoom_range(layer.name)
+            if not min_zoom <= zoom <= max_zoom:
                 continue
-            features = []
-            for geom, props in hits:
-                geojson_geom = _geometry_to_geojson_dict(geom)
-                features.append({"geometry": geojson_geom, "properties": props})
-            if features:
-                layer_payload.append({"name": layer.name, "features": features})
-        if not layer_payload:
-            return None
+            min_area, min_length = self._size_limits(layer.name, zoom)
+            clipped.append(
+                (
+                    layer,
+                    *layer.query_many(
+                        tile_bounds,
+                        min_area=min_area,
+                        min_length=min_length,
+                        clip=self._needs_clipping(layer.name, zoom),
+                    ),
+                )
+            )
+        return self._tile_features(zoom, tile_bounds, clipped)
+
+    def _tile_features(
+        self,
+        zoom: int,
+        tile_bounds: np.ndarray,
+        clipped: Sequence[Tuple[GeoJSONLayerIndex, np.ndarray, np.ndarray, np.ndarray]],
+    ) -> list[list[Tuple[str, list[Tuple["BaseGeometry", dict]]]]]:
+        """Simplify, project and orient clipped ``(layer, tile_pos, feature_idx, geoms)``
+        arrays and group them into per-tile feature lists (aggregates for layers that are
+        aggregated at ``zoom``)."""
+        tolerance, _, _ = self._generalization(zoom)
+        per_tile: list[list] = [[] for _ in range(len(tile_bounds))]
+        fields = self._tile_fields(zoom)
+        for layer, tile_pos, feature_idx, geoms in clipped:
+            if not len(geoms):
+                continue
+            mode = self._aggregate_mode(layer.name, zoom)
+            if mode:
+                aggregates = self._aggregate_features(mode, zoom, layer, tile_pos, feature_idx, geoms, tile_bounds)
+                for pos, features in aggregates.items():
+                    per_tile[pos].append((layer.name, features))
+                continue
+            if tolerance:
+                geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+            geoms = _to_tile_coords(geoms, tile_bounds[tile_pos])
+            if _ORIENT_POLYGONS:
+                geoms = shapely.orient_polygons(geoms, exterior_cw=False)
+            nonempty = ~shapely.is_empty(geoms)
+            grouped: dict[int, list] = {}
+            for pos, idx, geom in zip(tile_pos[nonempty].tolist(), feature_idx[nonempty].tolist(), geoms[nonempty]):
+                props = layer.properties(idx, fields)
+                grouped.setdefault(pos, []).append((geom, props))
+            for pos, features in grouped.items():
+                per_tile[pos].append((layer.name, features))
+        return per_tile
+
+    def _aggregate_mode(self, name: str, zoom: int) -> str | None:
+        below, mode = self.layer_aggregates.get(name, (None, None))
+        return mode if below is not None and zoom < below else None
+
+    def _needs_clipping(self, name: str, zoom: int) -> bool:
+        """``grid`` and ``points`` aggregates only need a point per feature, no clipping."""
+        return self._aggregate_mode(name, zoom) not in ("grid", "points")
+
+    def _size_limits(self, name: str, zoom: int) -> Tuple[float, float]:
+        """Minimum polygon area and line length for layer ``name`` at ``zoom``.
+
+        Counting aggregates keep every feature: small ones still count.
+        """
+        if not self._needs_clipping(name, zoom):
+            return 0.0, 0.0
+        _, min_area, min_length = self._generalization(zoom)
+        return min_area, min_length
+
+    def _aggregate_features(
+        self,
+        mode: str,
+        zoom: int,
+        layer: GeoJSONLayerIndex | _BlockLayer,
+        tile_pos: np.ndarray,
+        feature_idx: np.ndarray,
+        geoms: np.ndarray,
+        tile_bounds: np.ndarray,
+    ) -> dict[int, list[Tuple["BaseGeometry", dict]]]:
+        """Replace a layer's clipped features with aggregates in tile coordinates.
+
+        ``grid`` emits one square per occupied cell of an ``aggregate_cells`` grid with
+        the feature ``count`` and the most common ``aggregate_field`` value; ``points``
+        one point per cell and class at the mean position of its features, with their
+        ``count``; ``dissolve`` the union of each class's clipped features, simplified as
+        usual. ``grid`` and ``points`` place features by a representative point of the
+        full geometry, so they need no clipping and count every feature exactly once.
+        """
+        field = self.aggregate_field
+        codes, values = layer.class_values(field, feature_idx)
+        present = np.unique(codes[codes >= 0])
+        labels = sorted((values[code] for code in present.tolist()), key=str)
+        rank = {_value_key(label): position for position, label in enumerate(labels, start=1)}
+        # 0 is "no value"; the others follow the sorted labels so output is deterministic.
+        lookup = np.zeros(len(values) + 1, dtype=np.int64)
+        for code in present.tolist():
+            lookup[code + 1] = rank[_value_key(values[code])]
+        class_code = lookup[codes + 1]
+
+        def properties(code: int, count: int) -> dict:
+            return {field: labels[code - 1], "count": count} if code else {"count": count}
+
+        aggregates: dict[int, list] = {}
+        if mode == "dissolve":
+            tolerance, _, _ = self._generalization(zoom)
+            if tolerance:
+                geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+            geoms = _to_tile_coords(geoms, tile_bounds[tile_pos])
+            order = np.lexsort((class_code, tile_pos))
+            for (pos, code), members in groupby(order.tolist(), key=lambda i: (int(tile_pos[i]), int(class_code[i]))):
+                parts = geoms[list(members)]
+                dimension = int(shapely.get_dimensions(parts).max())
+                merged = _keep_dimension(shapely.union_all(parts, grid_size=1), dimension)
+                if dimension == 1:
+                    merged = shapely.line_merge(merged)
+                elif dimension == 2 and _ORIENT_POLYGONS:
+                    merged = shapely.orient_polygons(merged, exterior_cw=False)
+                if not merged.is_empty:
+                    aggregates.setdefault(pos, []).append((merged, properties(code, len(parts))))
+            return aggregates
+
+        # Count each feature once, in the tile holding its representative point.
+        coords = shapely.get_coordinates(layer.representative_points(feature_idx))
+        bounds = tile_bounds[tile_pos]
+        inside = (
+            (coords[:, 0] >= bounds[:, 0]) & (coords[:, 0] < bounds[:, 2])
+            & (coords[:, 1] > bounds[:, 1]) & (coords[:, 1] <= bounds[:, 3])
+        )
+        tile_pos, class_code, coords, bounds = tile_pos[inside], class_code[inside], coords[inside], bounds[inside]
+        if not len(tile_pos):
+            return aggregates
+        local_x = (coords[:, 0] - bounds[:, 0]) / (bounds[:, 2] - bounds[:, 0]) * MVT_EXTENT
+        local_y = (bounds[:, 3] - coords[:, 1]) / (bounds[:, 3] - bounds[:, 1]) * MVT_EXTENT
+        cells = self.aggregate_cells
+        cell_size = MVT_EXTENT / cells
+        cell = (
+            (tile_pos * cells + np.clip(local_y // cell_size, 0, cells - 1).astype(np.int64)) * cells
+            + np.clip(local_x // cell_size, 0, cells - 1).astype(np.int64)
+        )
+        groups, inverse, counts = np.unique(
+            np.column_stack((cell, class_code)), axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        if mode == "points":
+            mean_x = np.rint(np.bincount(inverse, weights=local_x) / counts)
+            mean_y = np.rint(np.bincount(inverse, weights=local_y) / counts)
+            for (cell_id, code), count, x, y in zip(groups.tolist(), counts.tolist(), mean_x, mean_y):
+                aggregates.setdefault(cell_id // (cells * cells), []).append(
+                    (shapely.Point(x, y), properties(code, count))
+                )
+            return aggregates
+
+        for cell_id, members in groupby(zip(groups.tolist(), counts.tolist()), key=lambda item: item[0][0]):
+            members = list(members)
+            # Classes are sorted, so ties go to the first one.
+            (_, code), _ = max(members, key=lambda item: item[1])
+            row, column = divmod(cell_id % (cells * cells), cells)
+            square = shapely.box(
+                round(column * cell_size), round(row * cell_size),
+                round((column + 1) * cell_size), round((row + 1) * cell_size),
+            )
+            if _ORIENT_POLYGONS:
+                square = shapely.orient_polygons(square, exterior_cw=False)
+            aggregates.setdefault(cell_id // (cells * cells), []).append(
+                (square, properties(code, sum(count for _, count in members)))
+            )
+        return aggregates
+
+    def _encode_within_budget(
+        self,
+        layer_features: list[Tuple[str, list[Tuple["BaseGeometry", dict]]]],
+    ) -> Tuple[bytes | None, int]:
+        """Encode the tile, dropping the least important features until it fits the budget.
+
+        Features are ranked by layer importance, then by size (square root of the area for
+        polygons, length for lines), and the lowest ranked ones are dropped first. Returns
+        the stored bytes (``None`` if nothing fits) and the number of dropped features.
+        """
+        total = sum(len(features) for _, features in layer_features)
+        keep = min(total, self.max_tile_features or total)
+        ranked = None
+        while True:
+            if keep < total:
+                if ranked is None:
+                    ranked = self._rank_features(layer_features)
+                current = self._most_important(ranked, keep)
+            else:
+                current = layer_features
+            data = self._compress(self._encode_features(current)) if current else None
+            if data is None or not self.max_tile_bytes or len(data) <= self.max_tile_bytes:
+                return data, total - keep
+            keep = int(keep * min(0.9, self.max_tile_bytes / len(data)))
+
+    def _rank_features(
+        self,
+        layer_features: list[Tuple[str, list[Tuple["BaseGeometry", dict]]]],
+    ) -> list[Tuple[tuple, str, "BaseGeometry", dict]]:
+        ranked = []
+        for layer_idx, (name, features) in enumerate(layer_features):
+            importance = self.layer_importance.get(name, 0)
+            for order, (geom, props) in enumerate(features):
+                if geom.geom_type in _POLYGON_TYPES:
+                    size = math.sqrt(geom.area)
+                else:
+                    size = geom.length
+                ranked.append(((-importance, -size, layer_idx, order), name, geom, props))
+        ranked.sort(key=lambda item: item[0])
+        return ranked
+
+    @staticmethod
+    def _most_important(
+        ranked: list[Tuple[tuple, str, "BaseGeometry", dict]],
+        keep: int,
+    ) -> list[Tuple[str, list[Tuple["BaseGeometry", dict]]]]:
+        """Keep the ``keep`` best ranked features, restoring layer and feature order."""
+        grouped: dict[str, list[Tuple["BaseGeometry", dict]]] = {}
+        for _, name, geom, props in sorted(ranked[:keep], key=lambda item: item[0][2:]):
+            grouped.setdefault(name, []).append((geom, props))
+        return list(grouped.items())
+
+    @staticmethod
+    def _encode_features(layer_features: list[Tuple[str, list[Tuple["BaseGeometry", dict]]]]) -> bytes:
+        """Encode geometries that are already in integer tile coordinates.
+
+        No quantization or y flip is left for the encoder to do; polygon orientation is
+        also handled up front when shapely can do it vectorized.
+        """
+        layer_payload = [
+            {
+                "name": name,
+                "features": [{"geometry": geom, "properties": props} for geom, props in features],
+            }
+            for name, features in layer_features
+        ]
         return mapbox_vector_tile.encode(
             layer_payload,
-            quantize_bounds=(bounds.west, bounds.south, bounds.east, bounds.north),
+            default_options={
+                "extents": MVT_EXTENT,
+                "y_coord_down": True,
+                "check_winding_order": not _ORIENT_POLYGONS,
+            },
         )
 
-    def _initialize_db(self, conn: sqlite3.Connection) -> None:
+    def _compress(self, encoded: bytes) -> bytes:
+        if self.compression_level:
+            # mtime=0 keeps the output deterministic for identical tiles.
+            return gzip.compress(encoded, compresslevel=self.compression_level, mtime=0)
+        return encoded
+
+    def _generalization(self, zoom: int) -> Tuple[float, float, float]:
+        """Return (simplify tolerance, min polygon area, min line length) for ``zoom``.
+
+        Sizes are in Web Mercator metres derived from the tile's pixel size on a 256 px
+        tile. The maximum zoom keeps full detail so overzoomed clients still see exact shapes.
+        """
+        if zoom >= self.max_zoom:
+            return 0.0, 0.0, 0.0
+        pixel = 2 * math.pi * EARTH_RADIUS / (1 << zoom) / TILE_PIXELS
+        min_length = self.min_feature_pixels * pixel
+        return self.simplify_pixels * pixel, min_length ** 2, min_length
+
+    def _tile_fields(self, zoom: int) -> frozenset[str] | None:
+        """Property fields kept at ``zoom`` (``None`` keeps them all)."""
+        if self.attribute_zoom is None or zoom >= self.attribute_zoom:
+            return None
+        return self.low_zoom_attributes
+
+    def _write_tiles(
+        self,
+        conn: sqlite3.Connection,
+        encoded_tiles: Iterable[_EncodedTile | _Checkpoint],
+        total: int,
+        progress_callback: Callable[[float, str], None] | None = None,
+        seen_hashes: set[str] | None = None,
+    ) -> dict:
+        """Insert encoded tiles, storing each distinct blob only once.
+
+        ``_Checkpoint`` markers in the stream are committed together with the tiles
+        before them every ``checkpoint_blocks`` blocks. Progress is reported as the sum of
+        the tiles' ``weight`` out of ``total``. ``seen_hashes`` lists images
+        already stored in the file. Returns the number of tiles written, the number of
+        distinct images, the per-zoom drop statistics of the size budget, the per-zoom
+        encoding time and the ``stats_top_n`` slowest tiles.
+        """
+        tile_count = 0
+        done = 0
+        progressed = 0
+        drop_stats: dict[int, dict[str, int]] = {}
+        encode_stats: dict[int, dict[str, float]] = {}
+        slowest: list[tuple[float, Tuple[int, int, int]]] = []
+        seen_hashes = set() if seen_hashes is None else seen_hashes
+        map_rows: list[tuple] = []
+        image_rows: list[tuple] = []
+        checkpoints: list[_Checkpoint] = []
+        for encoded in encoded_tiles:
+            if isinstance(encoded, _Checkpoint):
+                checkpoints.append(encoded)
+                if len(checkpoints) >= self.checkpoint_blocks:
+                    if map_rows:
+                        self._insert_tiles(conn, map_rows, image_rows)
+                        map_rows, image_rows = [], []
+                    self._record_checkpoints(conn, checkpoints)
+                    conn.commit()
+                    checkpoints = []
+                continue
+            done += 1
+            progressed += encoded.weight
+            tile_id = encoded.tile_id
+            zoom_time = encode_stats.setdefault(tile_id[0], {"tiles": 0, "seconds": 0.0})
+            zoom_time["tiles"] += 1
+            zoom_time["seconds"] += encoded.seconds
+            if self.stats_top_n:
+                if len(slowest) < self.stats_top_n:
+                    heapq.heappush(slowest, (encoded.seconds, tile_id))
+                elif encoded.seconds > slowest[0][0]:
+                    heapq.heapreplace(slowest, (encoded.seconds, tile_id))
+            if encoded.dropped:
+                zoom_stats = drop_stats.setdefault(tile_id[0], {"tiles": 0, "features": 0})
+                zoom_stats["tiles"] += 1
+                zoom_stats["features"] += encoded.dropped
+            if encoded.data:
+                tile_hash = encoded.tile_hash or _content_hash(encoded.data)
+                new_image = tile_hash not in seen_hashes
+                seen_hashes.add(tile_hash)
+                if self.bulk_load:
+                    map_rows.append(self._map_row(tile_id, tile_hash))
+                    if new_image:
+                        image_rows.append((encoded.data, tile_hash))
+                    if len(map_rows) >= self.batch_size:
+                        self._insert_tiles(conn, map_rows, image_rows)
+                        map_rows, image_rows = [], []
+                else:
+                    self._insert_tile(conn, tile_id, tile_hash, encoded.data if new_image else None)
+                tile_count += 1
+            if progress_callback:
+                fraction = min(progressed / max(total, 1), 1.0)
+                progress_callback(fraction, f"Encoded {done} tiles, {fraction:.0%} (z{tile_id[0]})")
+        if map_rows:
+            self._insert_tiles(conn, map_rows, image_rows)
+        if checkpoints:
+            self._record_checkpoints(conn, checkpoints)
+        conn.commit()
+        if drop_stats:
+            print(f"[VectorMBTilesBuilder] Size budget dropped features: {drop_stats}", flush=True)
+        return {
+            "tiles_written": tile_count,
+            "unique_tiles": len(seen_hashes),
+            "drop_stats": drop_stats,
+            "encode_stats": encode_stats,
+            "slowest_tiles": [
+                {"z": z, "x": x, "y": y, "ms": round(seconds * 1000, 3)}
+                for seconds, (z, x, y) in sorted(slowest, reverse=True)
+            ],
+        }
+
+    def _apply_bulk_pragmas(self, conn: sqlite3.Connection) -> None:
+        """Trade durability for write speed while the file is being built.
+
+        No fsyncs are needed until loading is finished. Checkpointed builds keep a WAL so
+        a killed process leaves the last checkpoint intact; otherwise the output is
+        rebuilt from scratch on failure and no journal is kept at all.
+        """
+        conn.execute(f"PRAGMA page_size = {int(self.page_size)}")
+        conn.execute(f"PRAGMA journal_mode = {'WAL' if self.checkpoint_blocks else 'OFF'}")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -131072")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    def _finalize_bulk_load(self, conn: sqlite3.Connection) -> None:
+        self._create_tile_index(conn)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("PRAGMA synchronous = FULL")
+        conn.execute("ANALYZE")
+        if self.vacuum:
+            conn.execute("VACUUM")
+
+    def _initialize_db(self, conn: sqlite3.Connection, create_index: bool = True) -> None:
+        """Create the deduplicated MBTiles layout: ``map`` + ``images`` behind a ``tiles`` view.
+
+        With ``hilbert_layout`` ``map`` is a ``WITHOUT ROWID`` table clustered on
+        ``tile_key`` (the PMTiles Hilbert tile id), so the rows of a viewport's tiles share
+        pages; readers that go through the ``tiles`` view are unaffected.
+        """
         cursor = conn.cursor()
         cursor.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
         cursor.execute("DELETE FROM metadata")
+        if self.hilbert_layout:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS map (
+                    tile_key INTEGER PRIMARY KEY,
+                    zoom_level INTEGER,
+                    tile_column INTEGER,
+                    tile_row INTEGER,
+                    tile_id TEXT
+                ) WITHOUT ROWID
+                """
+            )
+        else:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS map (
+                    zoom_level INTEGER,
+                    tile_column INTEGER,
+                    tile_row INTEGER,
+                    tile_id TEXT
+                )
+                """
+            )
+        cursor.execute("CREATE TABLE IF NOT EXISTS images (tile_data BLOB, tile_id TEXT)")
         cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS tiles (
-                zoom_level INTEGER,
-                tile_column INTEGER,
-                tile_row INTEGER,
-                tile_data BLOB
-            )
+            CREATE VIEW IF NOT EXISTS tiles AS
+            SELECT
+                map.zoom_level AS zoom_level,
+                map.tile_column AS tile_column,
+                map.tile_row AS tile_row,
+                images.tile_data AS tile_data
+            FROM map
+            JOIN images ON images.tile_id = map.tile_id
             """
         )
-        cursor.execute("DELETE FROM tiles")
-        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        cursor.execute("DELETE FROM map")
+        cursor.execute("DELETE FROM images")
+        if create_index:
+            self._create_tile_index(conn)
         conn.commit()
 
+    @staticmethod
+    def _create_tile_index(conn: sqlite3.Connection) -> None:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS map_index ON map (zoom_level, tile_column, tile_row)")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS images_id ON images (tile_id)")
+
     def _write_metadata(self, conn: sqlite3.Connection, bounds: tuple[float, float, float, float], layers: Sequence[GeoJSONLayerIndex]) -> None:
         west, south, east, north = bounds
         center_lon = (west + east) / 2
         center_lat = (south + north) / 2
+        zoom_ranges = {layer.name: self._layer_zoom_range(layer.name) for layer in layers}
+        zoom_ranges = {name: zooms for name, zooms in zoom_ranges.items() if zooms[0] <= zooms[1]}
+        min_zoom = min((zooms[0] for zooms in zoom_ranges.values()), default=self.min_zoom)
+        max_zoom = max((zooms[1] for zooms in zoom_ranges.values()), default=self.max_zoom)
         metadata = [
             ("name", "OSM Layers"),
             ("description", "Generated from GeoJSON via Python builder"),
             ("format", "pbf"),
             ("bounds", f"{west},{south},{east},{north}"),
-            ("center", f"{center_lon},{center_lat},{self.min_zoom}"),
-            ("minzoom", str(self.min_zoom)),
-            ("maxzoom", str(self.max_zoom)),
+            ("center", f"{center_lon},{center_lat},{min_zoom}"),
+            ("minzoom", str(min_zoom)),
+            ("maxzoom", str(max_zoom)),
+            ("compression", "gzip" if self.compression_level else "none"),
+            ("builder_settings", json.dumps(self._settings())),
         ]
         vector_layers = []
         for layer in layers:
+            if layer.name not in zoom_ranges:
+                continue
+            fields = layer.field_map()
+            if layer.name in self.layer_aggregates:
+                fields["count"] = "Number"
             vector_layers.append(
                 {
                     "id": layer.name,
                     "description": "",
-                    "minzoom": self.min_zoom,
-                    "maxzoom": self.max_zoom,
-                    "fields": layer.field_map(),
+                    "minzoom": zoom_ranges[layer.name][0],
+                    "maxzoom": zoom_ranges[layer.name][1],
+                    "fields": fields,
                 }
             )
         metadata.append(("json", json.dumps({"vector_layers": vector_layers})))
@@ -240,13 +2037,36 @@ class VectorMBTilesBuilder:
         cursor.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", metadata)
         conn.commit()
 
-    def _insert_tile(self, conn: sqlite3.Connection, tile: mercantile.Tile, data: bytes) -> None:
-        tms_row = (2 ** tile.z - 1) - tile.y
+    def _insert_tile(
+        self,
+        conn: sqlite3.Connection,
+        tile_id: Tuple[int, int, int],
+        tile_hash: str,
+        data: bytes | None,
+    ) -> None:
+        """Insert one tile; ``data`` is ``None`` when its image is already stored."""
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
-            (tile.z, tile.x, tms_row, sqlite3.Binary(data)),
-        )
+        if data is not None:
+            cursor.execute("INSERT OR REPLACE INTO images (tile_data, tile_id) VALUES (?, ?)", (data, tile_hash))
+        cursor.execute(self._map_insert_sql(), self._map_row(tile_id, tile_hash))
+
+    def _insert_tiles(self, conn: sqlite3.Connection, map_rows: Sequence[tuple], image_rows: Sequence[tuple]) -> None:
+        if image_rows:
+            conn.executemany("INSERT OR REPLACE INTO images (tile_data, tile_id) VALUES (?, ?)", image_rows)
+        conn.executemany(self._map_insert_sql(), map_rows)
+
+    def _map_insert_sql(self) -> str:
+        if self.hilbert_layout:
+            return (
+                "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id, tile_key) "
+                "VALUES (?, ?, ?, ?, ?)"
+            )
+        return "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)"
+
+    def _map_row(self, tile_id: Tuple[int, int, int], tile_hash: str) -> tuple:
+        z, x, y = tile_id
+        row = (z, x, (1 << z) - 1 - y, tile_hash)
+        return row + (zxy_to_tileid(z, x, y),) if self.hilbert_layout else row
 
     @staticmethod
     def _combined_bounds(layers: Sequence[GeoJSONLayerIndex]) -> tuple[float, float, float, float] | None:
@@ -4,6 +4,7 @@ import json
 import re
 import shutil
 import subprocess
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from typing import Callable
@@ -11,9 +12,14 @@ from typing import Callable
 from shapely.geometry import shape
 
 from .config import APP_CONFIG, PROCESSED_DIR, RAW_DIR, TILESERVER_DIR
+from .estimate import estimate_build
 from .geofabrik import GeofabrikClient
+from .geojson_stream import SEQUENCE_SUFFIXES
 from .processing import LayerProcessor
 from .mbtiles import VectorMBTilesBuilder
+from .pmtiles import mbtiles_to_pmtiles
+from .publish import publish_file, remove_sqlite_file, staging_path
+from .tilestats import tileset_stats
 
 
 def slugify(value: str) -> str:
@@ -104,7 +110,16 @@ def process_geofabrik(
 def convert_to_mbtiles(
     processed_metadata: dict,
     progress_callback: Callable[[float, str], None],
+    incremental: bool = False,
+    dry_run: bool = False,
 ) -> dict:
+    """Build the MBTiles from the processed layers (tippecanoe if installed, else Python).
+
+    With ``dry_run`` nothing is written: the Python builder's tiles, size and build time
+    are estimated from a sample of the features and returned as ``{"estimate": ...}``.
+    When tippecanoe would run the build the times are left out, since only the Python
+    builder is calibrated, and the tiles and size describe the Python builder's output.
+    """
     if not processed_metadata:
         raise ValueError("No processed data available. Run the processing step first.")
     print("[convert_to_mbtiles] Starting conversion", flush=True)
@@ -131,14 +146,51 @@ def convert_to_mbtiles(
     min_zoom = config.get("min_zoom", 5)
     max_zoom = config.get("max_zoom", 12)
 
+    drop_stats: dict = {}
+    build_result: dict = {}
     tippecanoe_cmd = config.get("tippecanoe_cmd", "tippecanoe")
     tippecanoe_available = bool(tippecanoe_cmd and shutil.which(tippecanoe_cmd))
 
+    # Per-layer files keep layer names (with their importance and zoom range) distinct in the tiles.
+    layer_inputs = [
+        (record["name"], record["path"])
+        for record in processed.get("layers") or []
+        if record.get("path") and Path(record["path"]).exists()
+    ] or [(Path(path).stem, path) for path in inputs]
+    inputs = [path for _, path in layer_inputs]
+    layer_zooms = {layer.name: (layer.min_zoom, layer.max_zoom) for layer in APP_CONFIG["layers"]}
+    layer_aggregates = {
+        layer.name: (layer.aggregate_below, layer.aggregate)
+        for layer in APP_CONFIG["layers"]
+        if layer.aggregate_below is not None
+    }
+
+    if dry_run:
+        builder = _python_builder(output_path, min_zoom, max_zoom, layer_zooms, layer_aggregates)
+        estimate = estimate_build(
+            builder,
+            layer_inputs,
+            sample_size=config.get("estimate_sample_features", 20_000),
+            calibration_tiles=config.get("estimate_calibration_tiles", 8),
+            progress_callback=progress_callback,
+        )
+        print(f"[convert_to_mbtiles] Estimated {estimate['total']['tiles']} tiles, {estimate['total']['bytes']} bytes", flush=True)
+        if tippecanoe_available:
+            for key in ("load_seconds", "encode_seconds", "build_seconds"):
+                estimate.pop(key, None)
+            for row in estimate["zooms"].values():
+                row.pop("encode_seconds", None)
+        return {"estimate": estimate, "tippecanoe": tippecanoe_available}
+
     if tippecanoe_available:
+        if incremental:
+            print("[convert_to_mbtiles] Incremental mode needs the Python builder, running a full tippecanoe build.", flush=True)
+        # Build next to the live file and swap it in only once tippecanoe succeeded.
+        staging = staging_path(output_path)
         args = [
             tippecanoe_cmd,
             "-o",
-            str(output_path),
+            str(staging),
             "--force",
             "--minimum-zoom",
             str(min_zoom),
@@ -146,34 +198,195 @@ def convert_to_mbtiles(
             str(max_zoom),
         ]
 
-        for path in inputs:
-            layer_name = Path(path).stem
+        for layer_name, path in layer_inputs:
             args.extend(["-L", f"{layer_name}:{path}"])
+        zoom_filter = _tippecanoe_zoom_filter(layer_inputs, _tippecanoe_zooms(layer_zooms, layer_aggregates))
+        if zoom_filter:
+            args.extend(["-j", json.dumps(zoom_filter)])
+        if all(Path(path).suffix.lower() in SEQUENCE_SUFFIXES for _, path in layer_inputs):
+            # Only safe on line-delimited input: tippecanoe splits the files at newlines.
+            args.append("--read-parallel")
 
         progress_callback(0.2, "Launching tippecanoe...")
         print(f"[convert_to_mbtiles] Running command: {' '.join(args)}", flush=True)
-        result = subprocess.run(args, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"[convert_to_mbtiles] Tippecanoe failed: {result.stderr or result.stdout}", flush=True)
-            raise RuntimeError(result.stderr or result.stdout or "Tippecanoe failed")
+
+        def _tippecanoe_progress(pct: float, message: str):
+            progress_callback(0.2 + pct * 0.75, message)
+
+        try:
+            _run_tippecanoe(args, _tippecanoe_progress)
+        except RuntimeError as exc:
+            print(f"[convert_to_mbtiles] Tippecanoe failed: {exc}", flush=True)
+            remove_sqlite_file(staging)
+            raise
+        publish_file(staging, output_path)
     else:
         print("[convert_to_mbtiles] Tippecanoe not found, using Python tile builder.", flush=True)
-        builder_inputs = [(Path(path).stem, path) for path in inputs]
-        builder = VectorMBTilesBuilder(output_path, min_zoom=min_zoom, max_zoom=max_zoom)
+        builder = _python_builder(output_path, min_zoom, max_zoom, layer_zooms, layer_aggregates)
         progress_callback(0.2, "Building MBTiles via Python...")
-        builder.build(builder_inputs)
+
+        def _build_progress(pct: float, message: str):
+            progress_callback(0.2 + pct * 0.75, message)
+
+        if incremental:
+            build_result = builder.update(layer_inputs, progress_callback=_build_progress)
+        else:
+            build_result = builder.build(layer_inputs, progress_callback=_build_progress)
+        drop_stats = build_result.get("drop_stats") or {}
 
     mbtiles_meta = {
         "mbtiles_path": str(output_path),
         "inputs": inputs,
         "timestamp": datetime.utcnow().isoformat(),
     }
+    if build_result.get("incremental"):
+        mbtiles_meta["incremental"] = {
+            "changed_features": build_result["changed_features"],
+            "tiles_updated": build_result["tiles_updated"],
+        }
+    if drop_stats:
+        mbtiles_meta["drop_stats"] = {str(zoom): stats for zoom, stats in sorted(drop_stats.items())}
     print(f"[convert_to_mbtiles] MBTiles created at {output_path}", flush=True)
+    progress_callback(0.95, "Collecting tileset statistics...")
+    stats = tileset_stats(
+        output_path,
+        top_n=config.get("stats_top_n", 10),
+        encode_stats=build_result.get("encode_stats"),
+    )
+    if build_result.get("slowest_tiles"):
+        stats["slowest_tiles"] = build_result["slowest_tiles"]
+    mbtiles_meta["stats"] = stats
+    if config.get("pmtiles"):
+        progress_callback(0.96, "Writing PMTiles archive...")
+        pmtiles_stats = mbtiles_to_pmtiles(output_path, Path(config["pmtiles_output"]))
+        mbtiles_meta["pmtiles_path"] = pmtiles_stats["pmtiles_path"]
+        print(f"[convert_to_mbtiles] PMTiles created at {pmtiles_stats['pmtiles_path']}", flush=True)
     _write_metadata(TILESERVER_DIR / "latest_mbtiles.json", mbtiles_meta)
     progress_callback(1.0, "MBTiles ready.")
     return mbtiles_meta
 
 
+def _python_builder(
+    output_path: Path,
+    min_zoom: int,
+    max_zoom: int,
+    layer_zooms: dict,
+    layer_aggregates: dict,
+) -> VectorMBTilesBuilder:
+    config = APP_CONFIG["mbtiles"]
+    return VectorMBTilesBuilder(
+        output_path,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        workers=config.get("workers", 1),
+        compression_level=config.get("gzip_level", 6),
+        simplify_pixels=config.get("simplify_pixels", 1.0),
+        min_feature_pixels=config.get("min_feature_pixels", 1.0),
+        attribute_zoom=config.get("attribute_zoom"),
+        max_tile_bytes=config.get("max_tile_bytes"),
+        max_tile_features=config.get("max_tile_features"),
+        layer_importance={layer.name: layer.importance for layer in APP_CONFIG["layers"]},
+        layer_zooms=layer_zooms,
+        checkpoint_blocks=config.get("checkpoint_blocks", 64),
+        stats_top_n=config.get("stats_top_n", 10),
+        external_memory=config.get("external_memory", False),
+        spool_run_pairs=config.get("spool_run_pairs", 4_000_000),
+        hilbert_layout=config.get("hilbert_layout", False),
+        layer_aggregates=layer_aggregates,
+    )
+
+
+_TIPPECANOE_PERCENT = re.compile(r"^\s*(\d+(?:\.\d+)?)%")
+_TIPPECANOE_READ = re.compile(r"^\s*Read ([\d.]+ million) features")
+
+
+def _run_tippecanoe(args: list[str], progress_callback: Callable[[float, str], None]) -> None:
+    """Run tippecanoe, forwarding the progress it writes to stderr as it happens.
+
+    tippecanoe redraws its progress line with ``\r``, so stderr is split on both line
+    endings. Progress lines are ``  12.3%  z/x/y`` (or ``{"progress": 12.3}`` with
+    ``--json-progress``); anything else is kept for the error message.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    log_tail: deque[str] = deque(maxlen=20)
+    last_percent = -1.0
+
+    def _handle(raw: bytes):
+        nonlocal last_percent
+        line = raw.decode("utf-8", errors="replace").strip()
+        if not line:
+            return
+        percent = _parse_tippecanoe_progress(line)
+        if percent is not None:
+            # Progress is redrawn for every few tiles; only report visible changes.
+            if percent - last_percent >= 0.5 or (percent >= 100 > last_percent):
+                last_percent = percent
+                progress_callback(percent / 100, f"tippecanoe: {percent:.1f}% of tiles")
+            return
+        match = _TIPPECANOE_READ.match(line)
+        if match:
+            progress_callback(0.0, f"tippecanoe: read {match.group(1)} features")
+            return
+        log_tail.append(line)
+        print(f"[tippecanoe] {line}", flush=True)
+
+    pending = b""
+    for chunk in iter(lambda: process.stderr.read1(65536), b""):
+        *lines, pending = re.split(rb"[\r\n]", pending + chunk)
+        for raw in lines:
+            _handle(raw)
+    _handle(pending)
+    returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError("\n".join(log_tail) or f"Tippecanoe exited with status {returncode}")
+
+
+def _parse_tippecanoe_progress(line: str) -> float | None:
+    if line.startswith("{"):
+        try:
+            return float(json.loads(line)["progress"])
+        except (ValueError, KeyError, TypeError):
+            return None
+    match = _TIPPECANOE_PERCENT.match(line)
+    return float(match.group(1)) if match else None
+
+
+def _tippecanoe_zooms(
+    layer_zooms: dict[str, tuple[int | None, int | None]],
+    layer_aggregates: dict[str, tuple[int, str]],
+) -> dict[str, tuple[int | None, int | None]]:
+    """Zoom ranges for tippecanoe, which cannot aggregate.
+
+    Counting aggregates (``grid``/``points``) have no raw equivalent, so those layers start
+    at their aggregation zoom; ``dissolve`` layers keep raw features at low zooms instead.
+    """
+    zooms = dict(layer_zooms)
+    for name, (below, mode) in layer_aggregates.items():
+        if mode == "dissolve":
+            continue
+        min_zoom, max_zoom = zooms.get(name) or (None, None)
+        zooms[name] = (below if min_zoom is None else max(min_zoom, below), max_zoom)
+    return zooms
+
+
+def _tippecanoe_zoom_filter(
+    layer_inputs: list[tuple[str, str]],
+    layer_zooms: dict[str, tuple[int | None, int | None]],
+) -> dict:
+    """Per-layer ``-j`` feature filter limiting each layer to its configured zoom range."""
+    filters = {}
+    for layer_name, _ in layer_inputs:
+        min_zoom, max_zoom = layer_zooms.get(layer_name) or (None, None)
+        conditions = []
+        if min_zoom is not None:
+            conditions.append([">=", "$zoom", min_zoom])
+        if max_zoom is not None:
+            conditions.append(["<=", "$zoom", max_zoom])
+        if conditions:
+            filters[layer_name] = ["all", *conditions]
+    return filters
+
+
 def run_pipeline(
     polygon_geojson: dict,
     progress_callback: Callable[[float, str], None],
@@ -0,0 +1,481 @@
+"""PMTiles v3 archives: writer (from MBTiles) and memory-mapped reader.
+
+A PMTiles file is a single, static-hostable archive: a 127-byte header, a compressed
+root directory, JSON metadata, optional leaf directories and the tile data, with tiles
+addressed by their position on a Hilbert curve. Identical tile contents are stored once
+and consecutive identical tiles collapse into a single run-length directory entry.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import mmap
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+from .publish import publish_file, staging_path
+
+MAGIC = b"PMTiles"
+VERSION = 3
+HEADER_SIZE = 127
+ROOT_DIRECTORY_LIMIT = 16_384 - HEADER_SIZE
+LEAF_SIZE = 4096
+# Tile ids are unsigned 64-bit integers, which holds every tile up to z31.
+MAX_ZOOM = 31
+
+COMPRESSION_NONE = 1
+COMPRESSION_GZIP = 2
+TILE_TYPE_MVT = 1
+
+_HEADER = struct.Struct("<7sB11Q6B4iB2i")
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    """Position of tile ``z/x/y`` on the PMTiles Hilbert curve (all zooms in one sequence)."""
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < (1 << z) or not 0 <= y < (1 << z):
+        raise ValueError(f"Tile {z}/{x}/{y} is outside the zoom level.")
+    tile_id = ((1 << (2 * z)) - 1) // 3
+    n = 1 << z
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def tileid_to_zxy(tile_id: int) -> Tuple[int, int, int]:
+    """Inverse of ``zxy_to_tileid``."""
+    z = 0
+    while tile_id >= ((1 << (2 * (z + 1))) - 1) // 3:
+        z += 1
+    position = tile_id - ((1 << (2 * z)) - 1) // 3
+    x = y = 0
+    s = 1
+    while s < (1 << z):
+        rx = 1 & (position >> 1)
+        ry = 1 & (position ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        position >>= 2
+        s <<= 1
+    return z, x, y
+
+
+@dataclass
+class Entry:
+    tile_id: int
+    offset: int
+    length: int
+    run_length: int
+
+
+@dataclass
+class Header:
+    root_offset: int
+    root_length: int
+    metadata_offset: int
+    metadata_length: int
+    leaf_offset: int
+    leaf_length: int
+    data_offset: int
+    data_length: int
+    addressed_tiles: int
+    tile_entries: int
+    tile_contents: int
+    clustered: bool
+    internal_compression: int
+    tile_compression: int
+    tile_type: int
+    min_zoom: int
+    max_zoom: int
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+    center_zoom: int
+    center_lon: float
+    center_lat: float
+
+    def pack(self) -> bytes:
+        return _HEADER.pack(
+            MAGIC,
+            VERSION,
+            self.root_offset,
+            self.root_length,
+            self.metadata_offset,
+            self.metadata_length,
+            self.leaf_offset,
+            self.leaf_length,
+            self.data_offset,
+            self.data_length,
+            self.addressed_tiles,
+            self.tile_entries,
+            self.tile_contents,
+            int(self.clustered),
+            self.internal_compression,
+            self.tile_compression,
+            self.tile_type,
+            self.min_zoom,
+            self.max_zoom,
+            _e7(self.min_lon),
+            _e7(self.min_lat),
+            _e7(self.max_lon),
+            _e7(self.max_lat),
+            self.center_zoom,
+            _e7(self.center_lon),
+            _e7(self.center_lat),
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "Header":
+        fields = _HEADER.unpack(bytes(data[:HEADER_SIZE]))
+        if fields[0] != MAGIC:
+            raise ValueError("Not a PMTiles archive.")
+        if fields[1] != VERSION:
+            raise ValueError(f"Unsupported PMTiles version {fields[1]}.")
+        values = list(fields[2:])
+        values[11] = bool(values[11])
+        for idx in (17, 18, 19, 20, 22, 23):
+            values[idx] = values[idx] / 1e7
+        return cls(*values)
+
+
+def _e7(value: float) -> int:
+    return int(round(value * 1e7))
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def serialize_directory(entries: Sequence[Entry]) -> bytes:
+    """Column-wise varint encoding from the spec (delta tile ids, implicit contiguous offsets)."""
+    out = bytearray()
+    _write_varint(out, len(entries))
+    last_id = 0
+    for entry in entries:
+        _write_varint(out, entry.tile_id - last_id)
+        last_id = entry.tile_id
+    for entry in entries:
+        _write_varint(out, entry.run_length)
+    for entry in entries:
+        _write_varint(out, entry.length)
+    previous = None
+    for entry in entries:
+        if previous is not None and entry.offset == previous.offset + previous.length:
+            _write_varint(out, 0)
+        else:
+            _write_varint(out, entry.offset + 1)
+        previous = entry
+    return bytes(out)
+
+
+def deserialize_directory(data: bytes) -> "_Directory":
+    count, pos = _read_varint(data, 0)
+    tile_ids = [0] * count
+    run_lengths = [0] * count
+    lengths = [0] * count
+    offsets = [0] * count
+    last_id = 0
+    for idx in range(count):
+        delta, pos = _read_varint(data, pos)
+        last_id += delta
+        tile_ids[idx] = last_id
+    for idx in range(count):
+        run_lengths[idx], pos = _read_varint(data, pos)
+    for idx in range(count):
+        lengths[idx], pos = _read_varint(data, pos)
+    for idx in range(count):
+        value, pos = _read_varint(data, pos)
+        if value == 0 and idx > 0:
+            offsets[idx] = offsets[idx - 1] + lengths[idx - 1]
+        else:
+            offsets[idx] = value - 1
+    return _Directory(tile_ids, offsets, lengths, run_lengths)
+
+
+@dataclass
+class _Directory:
+    tile_ids: List[int]
+    offsets: List[int]
+    lengths: List[int]
+    run_lengths: List[int]
+
+    def find(self, tile_id: int) -> int | None:
+        """Index of the entry covering ``tile_id`` (or of the leaf that may hold it)."""
+        idx = bisect_right(self.tile_ids, tile_id) - 1
+        if idx < 0:
+            return None
+        run_length = self.run_lengths[idx]
+        if run_length == 0 or tile_id < self.tile_ids[idx] + run_length:
+            return idx
+        return None
+
+
+def _build_directories(entries: Sequence[Entry]) -> Tuple[bytes, bytes]:
+    """Return the compressed root directory and leaf directories.
+
+    Everything goes into the root when it fits in the first 16 KiB of the file;
+    otherwise entries are split into leaves, doubling the leaf size until the root fits.
+    """
+    root = _compress(serialize_directory(entries))
+    if len(root) <= ROOT_DIRECTORY_LIMIT:
+        return root, b""
+    leaf_size = max(LEAF_SIZE, len(entries) // 3500)
+    while True:
+        root_entries = []
+        leaves = bytearray()
+        for start in range(0, len(entries), leaf_size):
+            chunk = entries[start:start + leaf_size]
+            leaf = _compress(serialize_directory(chunk))
+            root_entries.append(Entry(chunk[0].tile_id, len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = _compress(serialize_directory(root_entries))
+        if len(root) <= ROOT_DIRECTORY_LIMIT:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+def _compress(data: bytes) -> bytes:
+    return gzip.compress(data, mtime=0)
+
+
+def mbtiles_to_pmtiles(mbtiles_path: Path, pmtiles_path: Path) -> dict:
+    """Write the tiles and metadata of an MBTiles file as a clustered PMTiles v3 archive.
+
+    Tile data is laid out in Hilbert order, each distinct tile content is stored once and
+    runs of consecutive identical tiles share one directory entry. The archive is written
+    to a staging sibling and renamed into place, so a server mapping the previous archive
+    is never handed a half-written file. Returns archive stats.
+    """
+    mbtiles_path = Path(mbtiles_path)
+    pmtiles_path = Path(pmtiles_path)
+    conn = sqlite3.connect(mbtiles_path)
+    try:
+        metadata = dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+        keys = sorted(
+            (zxy_to_tileid(z, x, (1 << z) - 1 - row), z, x, row)
+            for z, x, row in conn.execute("SELECT zoom_level, tile_column, tile_row FROM tiles")
+        )
+        pmtiles_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryFile(dir=pmtiles_path.parent) as data_file:
+            entries, contents, tile_compression = _write_tile_data(conn, keys, data_file)
+            data_length = data_file.tell()
+            root, leaves = _build_directories(entries)
+            meta_blob = _compress(json.dumps(_pmtiles_metadata(metadata), separators=(",", ":")).encode("utf-8"))
+            header = _header_for(metadata, keys, entries, contents, tile_compression)
+            header.root_offset = HEADER_SIZE
+            header.root_length = len(root)
+            header.metadata_offset = header.root_offset + len(root)
+            header.metadata_length = len(meta_blob)
+            header.leaf_offset = header.metadata_offset + len(meta_blob)
+            header.leaf_length = len(leaves)
+            header.data_offset = header.leaf_offset + len(leaves)
+            header.data_length = data_length
+            staging = staging_path(pmtiles_path)
+            with staging.open("wb") as out:
+                out.write(header.pack())
+                out.write(root)
+                out.write(meta_blob)
+                out.write(leaves)
+                data_file.seek(0)
+                shutil.copyfileobj(data_file, out, 1 << 20)
+            publish_file(staging, pmtiles_path)
+    finally:
+        conn.close()
+    return {
+        "pmtiles_path": str(pmtiles_path),
+        "addressed_tiles": len(keys),
+        "tile_entries": len(entries),
+        "tile_contents": contents,
+        "leaf_directories": bool(leaves),
+    }
+
+
+def _write_tile_data(conn: sqlite3.Connection, keys: Iterable[tuple], data_file) -> Tuple[List[Entry], int, int]:
+    entries: List[Entry] = []
+    offsets: dict[bytes, Tuple[int, int]] = {}
+    tile_compression = COMPRESSION_NONE
+    for tile_id, z, x, row in keys:
+        (data,) = conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, row),
+        ).fetchone()
+        data = bytes(data)
+        if data[:2] == _GZIP_MAGIC:
+            tile_compression = COMPRESSION_GZIP
+        digest = hashlib.md5(data, usedforsecurity=False).digest()
+        location = offsets.get(digest)
+        if location is None:
+            location = offsets[digest] = (data_file.tell(), len(data))
+            data_file.write(data)
+        last = entries[-1] if entries else None
+        if (
+            last is not None
+            and last.tile_id + last.run_length == tile_id
+            and (last.offset, last.length) == location
+        ):
+            last.run_length += 1
+        else:
+            entries.append(Entry(tile_id, location[0], location[1], 1))
+    return entries, len(offsets), tile_compression
+
+
+def _pmtiles_metadata(metadata: dict) -> dict:
+    """PMTiles keeps MBTiles' ``json`` row (vector_layers, ...) as top-level keys."""
+    payload = {key: value for key, value in metadata.items() if key != "json"}
+    try:
+        payload.update(json.loads(metadata.get("json") or "{}"))
+    except json.JSONDecodeError:
+        pass
+    return payload
+
+
+def _header_for(metadata: dict, keys: Sequence[tuple], entries: Sequence[Entry], contents: int, tile_compression: int) -> Header:
+    zooms = [z for _, z, _, _ in keys]
+    min_zoom = int(metadata.get("minzoom", min(zooms, default=0)))
+    max_zoom = int(metadata.get("maxzoom", max(zooms, default=0)))
+    try:
+        west, south, east, north = (float(value) for value in metadata["bounds"].split(","))
+    except (KeyError, ValueError):
+        west, south, east, north = -180.0, -85.0511287798066, 180.0, 85.0511287798066
+    try:
+        center_lon, center_lat, center_zoom = (float(value) for value in metadata["center"].split(","))
+    except (KeyError, ValueError):
+        center_lon, center_lat, center_zoom = (west + east) / 2, (south + north) / 2, min_zoom
+    return Header(
+        root_offset=0,
+        root_length=0,
+        metadata_offset=0,
+        metadata_length=0,
+        leaf_offset=0,
+        leaf_length=0,
+        data_offset=0,
+        data_length=0,
+        addressed_tiles=len(keys),
+        tile_entries=len(entries),
+        tile_contents=contents,
+        clustered=True,
+        internal_compression=COMPRESSION_GZIP,
+        tile_compression=tile_compression,
+        tile_type=TILE_TYPE_MVT,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        min_lon=west,
+        min_lat=south,
+        max_lon=east,
+        max_lat=north,
+        center_zoom=int(center_zoom),
+        center_lon=center_lon,
+        center_lat=center_lat,
+    )
+
+
+class PMTilesReader:
+    """Memory-mapped PMTiles v3 reader.
+
+    The root directory is decoded once and leaf directories are kept in a small LRU
+    cache, so a lookup is a couple of binary searches; tiles are returned as zero-copy
+    ``memoryview`` slices of the mapping.
+    """
+
+    def __init__(self, path: Path, leaf_cache_size: int = 64):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.header = Header.unpack(self._view[:HEADER_SIZE])
+        self._root = self._read_directory(self.header.root_offset, self.header.root_length)
+        self._leaves: OrderedDict[int, _Directory] = OrderedDict()
+        self._leaf_cache_size = leaf_cache_size
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            # Tiles handed out are still referenced; the mapping is freed with them.
+            pass
+        self._file.close()
+
+    def metadata(self) -> dict:
+        blob = self._view[self.header.metadata_offset:self.header.metadata_offset + self.header.metadata_length]
+        return json.loads(self._decompress(blob))
+
+    def get(self, z: int, x: int, y: int) -> memoryview | None:
+        """Return tile ``z/x/y`` (XYZ scheme) or ``None``."""
+        if not 0 <= z <= MAX_ZOOM or not 0 <= x < (1 << z) or not 0 <= y < (1 << z):
+            return None
+        tile_id = zxy_to_tileid(z, x, y)
+        directory = self._root
+        for _ in range(4):  # root + up to three levels of leaves
+            idx = directory.find(tile_id)
+            if idx is None:
+                return None
+            offset, length = directory.offsets[idx], directory.lengths[idx]
+            if directory.run_lengths[idx]:
+                start = self.header.data_offset + offset
+                return self._view[start:start + length]
+            directory = self._leaf(self.header.leaf_offset + offset, length)
+        return None
+
+    def _leaf(self, offset: int, length: int) -> _Directory:
+        with self._lock:
+            directory = self._leaves.get(offset)
+            if directory is not None:
+                self._leaves.move_to_end(offset)
+                return directory
+        directory = self._read_directory(offset, length)
+        with self._lock:
+            self._leaves[offset] = directory
+            if len(self._leaves) > self._leaf_cache_size:
+                self._leaves.popitem(last=False)
+        return directory
+
+    def _read_directory(self, offset: int, length: int) -> _Directory:
+        return deserialize_directory(self._decompress(self._view[offset:offset + length]))
+
+    def _decompress(self, blob: memoryview) -> bytes:
+        if self.header.internal_compression == COMPRESSION_GZIP:
+            return gzip.decompress(blob)
+        if self.header.internal_compression == COMPRESSION_NONE:
+            return bytes(blob)
+        raise ValueError(f"Unsupported PMTiles internal compression {self.header.internal_compression}.")
@@ -11,6 +11,7 @@ import geopandas as gpd
 from shapely.geometry import shape
 
 from .config import LayerConfig
+from .geojson_stream import iter_features
 
 
 class LayerProcessor:
@@ -100,18 +101,28 @@ class LayerProcessor:
         }
 
     def _write_geojson(self, gdf: gpd.GeoDataFrame, layer: LayerConfig, suffix: str = "") -> Path:
+        """Write one layer as newline-delimited GeoJSON (one feature per line).
+
+        Line-delimited files can be split by tippecanoe's ``--read-parallel`` and are
+        streamed by the Python builder without parsing the whole file at once.
+        """
         self.processed_dir.mkdir(parents=True, exist_ok=True)
-        out_path = self.processed_dir / f"{layer.name}{suffix}.geojson"
-        gdf.to_file(out_path, driver="GeoJSON")
+        out_path = self.processed_dir / f"{layer.name}{suffix}.geojsonl"
+        gdf.to_file(out_path, driver="GeoJSONSeq")
         return out_path
 
     def _merge_to_single_geojson(self, files: list[Path], geom_type: str, suffix: str = "") -> Path:
+        """Concatenate per-layer files into one FeatureCollection for the map preview."""
         merged_path = self.processed_dir / f"{geom_type}_layers{suffix}.geojson"
-        geojson_content = {"type": "FeatureCollection", "features": []}
-        for file in files:
-            data = json.loads(Path(file).read_text(encoding="utf-8"))
-            geojson_content["features"].extend(data.get("features", []))
-        merged_path.write_text(json.dumps(geojson_content), encoding="utf-8")
+        with merged_path.open("w", encoding="utf-8") as handle:
+            handle.write('{"type": "FeatureCollection", "features": [')
+            separator = ""
+            for file in files:
+                for feature in iter_features(file):
+                    handle.write(separator)
+                    handle.write(json.dumps(feature))
+                    separator = ", "
+            handle.write("]}")
         return merged_path
 
     @staticmethod
@@ -0,0 +1,88 @@
+"""Build-then-publish helpers for tileset files.
+
+Builders write to a deterministic sibling of the live file and swap it into place with
+an atomic rename, so the previous tileset keeps being served until the new one is
+complete and a failed build never touches it. Readers in this process (the bundled
+tile server) register a release hook so they let go of the live file while it is
+replaced, which Windows requires.
+
+Incremental updates are the exception: they write to the live file in place, inside
+SQLite transactions, and mark it with an ``UPDATED_IN_PLACE_TABLE`` table so readers
+know not to open it as immutable.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Callable, ContextManager, Iterator
+
+SQLITE_SIDECARS = ("-wal", "-shm", "-journal")
+UPDATED_IN_PLACE_TABLE = "in_place_updates"
+
+# ``hook(path)`` returns a context manager during which the hook's owner holds no handle
+# on ``path``; see ``released``.
+ReleaseHook = Callable[[Path], ContextManager[None]]
+_release_hooks: list[ReleaseHook] = []
+
+
+def register_release_hook(hook: ReleaseHook) -> None:
+    """Have ``hook`` release its handles on a file whenever that file is replaced."""
+    if hook not in _release_hooks:
+        _release_hooks.append(hook)
+
+
+def unregister_release_hook(hook: ReleaseHook) -> None:
+    if hook in _release_hooks:
+        _release_hooks.remove(hook)
+
+
+@contextmanager
+def released(path: Path) -> Iterator[None]:
+    """Keep every registered reader off ``path`` for the duration of the block."""
+    with ExitStack() as stack:
+        for hook in list(_release_hooks):
+            stack.enter_context(hook(Path(path)))
+        yield
+
+
+def staging_path(path: Path) -> Path:
+    """``osm_layers.mbtiles`` -> ``osm_layers.building.mbtiles`` (same directory, same suffix)."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.building{path.suffix}")
+
+
+def publish_file(staging: Path, target: Path, retries: int = 20, delay: float = 0.5) -> None:
+    """Atomically replace ``target`` with ``staging``.
+
+    On Windows the rename fails while a reader still holds ``target`` open: registered
+    readers are released first, and readers in other processes are waited for by
+    retrying for a while before giving up.
+    """
+    with released(target):
+        for attempt in range(retries):
+            try:
+                os.replace(staging, target)
+                return
+            except PermissionError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(delay)
+
+
+def remove_sqlite_file(path: Path, retries: int = 20, delay: float = 0.5) -> None:
+    """Delete an SQLite file together with its WAL/journal sidecars."""
+    path = Path(path)
+    for candidate in (path, *(path.with_name(path.name + suffix) for suffix in SQLITE_SIDECARS)):
+        for attempt in range(retries):
+            try:
+                candidate.unlink()
+                break
+            except FileNotFoundError:
+                break
+            except PermissionError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(delay)
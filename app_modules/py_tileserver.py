@@ -1,26 +1,176 @@
 from __future__ import annotations
 
 import asyncio
+import gzip
+import hashlib
 import json
 import os
 import sqlite3
 import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
+from .pmtiles import PMTilesReader, zxy_to_tileid
+from .publish import UPDATED_IN_PLACE_TABLE
+from .tilestats import tileset_stats
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZXY_TILE_QUERY = "SELECT tile_data, NULL AS tile_hash FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?"
+# Deduplicated ``map``/``images`` files (the Python builder, tippecanoe) key images by a
+# hash of their content, which doubles as the tile's ETag.
+MAP_TILE_QUERY = (
+    "SELECT images.tile_data AS tile_data, map.tile_id AS tile_hash FROM map "
+    "JOIN images ON images.tile_id = map.tile_id "
+    "WHERE map.zoom_level=? AND map.tile_column=? AND map.tile_row=?"
+)
+# Builds with ``hilbert_layout`` cluster ``map`` on the PMTiles tile id.
+HILBERT_TILE_QUERY = (
+    "SELECT images.tile_data AS tile_data, map.tile_id AS tile_hash FROM map "
+    "JOIN images ON images.tile_id = map.tile_id WHERE map.tile_key=?"
+)
+
+
+class _TileConnection(sqlite3.Connection):
+    """SQLite connection that remembers how its file stores tiles."""
+
+    hilbert_keys = False
+    map_layout = False
+    immutable = False
+    generation = -1
+    owner: threading.Thread | None = None
+
+
+class TileCache:
+    """Thread-safe LRU of ``(payload, content hash)`` tiles, bounded by their total size in bytes.
+
+    Lookups of tiles that do not exist are cached too (as ``None``). Every entry is
+    charged ``ENTRY_OVERHEAD`` bytes on top of its payload, so the many small and
+    empty entries of a busy low-zoom area are bounded as well.
+    """
+
+    ENTRY_OVERHEAD = 128
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, Tuple[bytes, str] | None] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Tuple[bool, Tuple[bytes, str] | None]:
+        """``(found, tile)``; ``tile`` is ``None`` for a cached missing tile."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: tuple, tile: Tuple[bytes, str] | None) -> None:
+        cost = self._cost(tile)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._cost(self._entries.pop(key))
+            self._entries[key] = tile
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._cost(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _cost(self, tile: Tuple[bytes, str] | None) -> int:
+        return self.ENTRY_OVERHEAD + (len(tile[0]) if tile else 0)
+
 
 class PythonTileServer:
-    """Minimal vector tile server that reads MBTiles and exposes HTTP endpoints."""
+    """Minimal vector tile server that reads MBTiles (or a PMTiles archive) and exposes HTTP endpoints.
+
+    Sync endpoints run on uvicorn's threadpool; every worker thread reads the MBTiles
+    through its own read-only connection (``mmap_size`` bytes memory-mapped, a
+    ``cache_kib`` page cache), so concurrent tile requests do not serialize. Tiles are
+    served from a ``TileCache`` of ``tile_cache_bytes`` (``0`` disables it) that is
+    emptied whenever the source is reloaded; the source file is checked for replacement
+    at most every ``SOURCE_CHECK_SECONDS``.
+
+    Responses carry strong ETags (tile content hashes, hashes of the JSON bodies), the
+    source file's modification time as ``Last-Modified`` and ``Cache-Control: max-age``
+    of ``max_age`` seconds, or ``versioned_max_age`` for tile URLs that name the current
+    tileset version (``?v=``, as in the style), which change with every new tileset.
+    Conditional requests that match are answered with ``304 Not Modified``.
+    """
 
-    def __init__(self, mbtiles_path: Path, port: int, host: str = "127.0.0.1"):
+    SOURCE_CHECK_SECONDS = 1.0
+    RELEASE_TIMEOUT_SECONDS = 10.0
+
+    def __init__(
+        self,
+        mbtiles_path: Path,
+        port: int,
+        host: str = "127.0.0.1",
+        stats_path: Path | None = None,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_kib: int = 8192,
+        tile_cache_bytes: int = 64 * 1024 * 1024,
+        max_age: int = 300,
+        versioned_max_age: int = 365 * 24 * 3600,
+    ):
         self.mbtiles_path = Path(mbtiles_path)
+        # Statistics are computed from an MBTiles file, also when a PMTiles archive is served.
+        self.stats_path = Path(stats_path) if stats_path else self.mbtiles_path
         self.port = port
         self.host = host
-        self._conn: sqlite3.Connection | None = None
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self.max_age = max_age
+        self.versioned_max_age = versioned_max_age
+        self._stats_cache: dict[tuple, dict] = {}
+        # One read-only SQLite connection per request thread (or one shared PMTiles
+        # reader), all registered for cleanup; ``_generation`` changes whenever the source
+        # is reloaded or closed. Handles are counted while requests read from them
+        # (``_in_use``); superseded ones that are still in use wait in ``_retired`` until
+        # their last request is done.
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._generation = 0
+        self._pmtiles: PMTilesReader | None = None
+        self._in_use: dict[object, int] = {}
+        self._retired: list[sqlite3.Connection | PMTilesReader] = []
+        self._source_lock = threading.Lock()
+        # Signalled when a retired handle is closed or ``released`` ends; while
+        # ``_paused`` no handle is opened.
+        self._source_changed = threading.Condition(self._source_lock)
+        self._paused = False
+        self._tile_cache = TileCache(tile_cache_bytes) if tile_cache_bytes > 0 else None
+        self._source_identity = self._file_identity()
+        self._source_checked_at = time.monotonic()
         self._app: FastAPI | None = None
         self._server: uvicorn.Server | None = None
         self._thread: threading.Thread | None = None
@@ -64,9 +214,76 @@ class PythonTileServer:
                 self._thread.join(timeout=5)
         self._thread = None
         self._server = None
-        if self._conn:
-            self._conn.close()
-            self._conn = None
+        self._close_sources()
+
+    def reload(self, path: Path | None = None) -> None:
+        """Serve a newly published tileset (optionally at another path) from the next request on.
+
+        Builders replace the file with an atomic rename, so the open handles still point
+        at the previous file until they are reopened; the server itself keeps running.
+        Connections and the PMTiles reader are closed right away when no request is
+        reading from them, otherwise as soon as their last request finishes, so idle
+        threads do not keep the old file open.
+        """
+        with self._source_lock:
+            if path is not None:
+                self.mbtiles_path = Path(path)
+            self._generation += 1
+            self._source_identity = self._file_identity()
+            idle = self._retire_sources()
+        for handle in idle:
+            handle.close()
+        if self._tile_cache:
+            self._tile_cache.clear()
+        print(f"[PythonTileServer] Reloaded {self.mbtiles_path}", flush=True)
+
+    @contextmanager
+    def released(self, path: Path) -> Iterator[None]:
+        """Hold no handle on ``path`` for the duration of the block, then reload it.
+
+        Registered with ``publish.register_release_hook`` so the file can be replaced on
+        Windows, where an open file cannot be renamed over. Requests arriving meanwhile
+        wait; requests already reading get ``RELEASE_TIMEOUT_SECONDS`` to finish.
+        """
+        if Path(path).resolve() != self.mbtiles_path.resolve():
+            yield
+            return
+        with self._source_lock:
+            self._paused = True
+            self._generation += 1
+            idle = self._retire_sources()
+        for handle in idle:
+            handle.close()
+        try:
+            with self._source_lock:
+                if not self._source_changed.wait_for(lambda: not self._retired, self.RELEASE_TIMEOUT_SECONDS):
+                    print(f"[PythonTileServer] Requests still reading {path}, replacing it anyway", flush=True)
+            yield
+        finally:
+            with self._source_lock:
+                self._paused = False
+                self._source_changed.notify_all()
+            self.reload()
+
+    def _close_sources(self):
+        """Close every handle (those still in use once their request finishes)."""
+        with self._source_lock:
+            self._generation += 1
+            idle = self._retire_sources()
+        for handle in idle:
+            handle.close()
+
+    def _retire_sources(self) -> list[sqlite3.Connection | PMTilesReader]:
+        """Take every handle out of service; return the idle ones for the caller to close.
+
+        Call with ``_source_lock`` held; the busy ones are closed by ``_source``.
+        """
+        handles = self._connections + ([self._pmtiles] if self._pmtiles else [])
+        idle = [handle for handle in handles if not self._in_use.get(handle)]
+        self._retired.extend(handle for handle in handles if self._in_use.get(handle))
+        self._connections = []
+        self._pmtiles = None
+        return idle
 
     # Internal helpers -------------------------------------------------
 
@@ -83,19 +300,44 @@ class PythonTileServer:
         )
 
         @app.get("/metadata.json")
-        def metadata():
-            return self._metadata()
+        def metadata(request: Request):
+            return self._json_response(request, self._metadata())
 
         @app.get("/data/vectiles/{z}/{x}/{y}.pbf")
-        def tile(z: int, x: int, y: int):
-            payload = self._fetch_tile(z, x, y)
-            if payload is None:
+        def tile(z: int, x: int, y: int, request: Request, v: str | None = None):
+            cached = self._cached_tile(z, x, y)
+            if cached is None:
                 raise HTTPException(status_code=404, detail="Tile not found")
-            return Response(payload, media_type="application/x-protobuf")
+            payload, tile_hash = cached
+            headers = {"Vary": "Accept-Encoding"}
+            inflate = False
+            if payload[:2] == GZIP_MAGIC:
+                # Both builders may store gzipped tiles; only pass them through untouched
+                # when the client said it can inflate them.
+                if self._accepts_gzip(request.headers.get("accept-encoding", "")):
+                    headers["Content-Encoding"] = "gzip"
+                else:
+                    inflate = True
+            # Each representation needs its own strong ETag.
+            etag = f'"{tile_hash}-identity"' if inflate else f'"{tile_hash}"'
+            response = self._conditional_response(request, etag, headers, versioned=v is not None and v == self._version())
+            if response:
+                return response
+            if inflate:
+                payload = gzip.decompress(payload)
+            return Response(payload, media_type="application/x-protobuf", headers=headers)
+
+        @app.get("/cache.json")
+        def cache():
+            return self._tile_cache.stats() if self._tile_cache else {"max_bytes": 0}
+
+        @app.get("/stats.json")
+        def stats(top: int = 10):
+            return self._stats(top)
 
         @app.get("/styles/osm-bright/style.json")
-        def style():
-            return self._style_payload()
+        def style(request: Request):
+            return self._json_response(request, self._style_payload())
 
         self._app = app
 
@@ -107,31 +349,289 @@ class PythonTileServer:
                 pass
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    def _ensure_connection(self):
-        if self._conn:
-            return
-        self._conn = sqlite3.connect(self.mbtiles_path, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+    def _ensure_connection(self) -> Tuple[sqlite3.Connection | None, PMTilesReader | None]:
+        """Return the current source, opening it if needed; exactly one of the two is set.
+
+        A PMTiles reader is shared by all threads, SQLite connections are per thread.
+        Waits while the file is being replaced (see ``released``).
+        """
+        while True:
+            with self._source_lock:
+                self._source_changed.wait_for(lambda: not self._paused)
+                generation = self._generation
+                path = self.mbtiles_path
+                if path.suffix.lower() == ".pmtiles":
+                    if self._pmtiles is None:
+                        self._pmtiles = PMTilesReader(path)
+                    return None, self._pmtiles
+            conn = getattr(self._local, "conn", None)
+            if conn is not None and conn.generation == generation:
+                return conn, None
+            if conn is not None:
+                self._local.conn = None
+                self._release_connection(conn)
+            conn = self._open_connection(path, generation)
+            if conn is not None:
+                self._local.conn = conn
+                return conn, None
+
+    @contextmanager
+    def _source(self) -> Iterator[Tuple[sqlite3.Connection | None, PMTilesReader | None]]:
+        """``_ensure_connection`` for the duration of one request.
+
+        While the block runs the handle counts as in use, so a reload in the meantime
+        leaves it open and it is closed here once the last request using it is done.
+        Nothing read from a PMTiles memory map may outlive the block.
+        """
+        while True:
+            conn, reader = self._ensure_connection()
+            handle = reader or conn
+            with self._source_lock:
+                # A reload between opening and counting may already have retired it.
+                if handle is self._pmtiles or handle in self._connections:
+                    self._in_use[handle] = self._in_use.get(handle, 0) + 1
+                    break
+        try:
+            yield conn, reader
+        finally:
+            with self._source_lock:
+                self._in_use[handle] -= 1
+                done = not self._in_use[handle]
+                if done:
+                    del self._in_use[handle]
+                retired = done and handle in self._retired
+                if retired:
+                    self._retired.remove(handle)
+            if retired:
+                handle.close()
+                with self._source_lock:
+                    self._source_changed.notify_all()
+
+    def _open_connection(self, path: Path, generation: int) -> _TileConnection | None:
+        """Open ``path`` read-only for the calling thread.
+
+        Files published by an atomic rename are never modified afterwards and are
+        reopened as ``immutable=1``, which lets SQLite skip file locking and change
+        detection; a new build is picked up through ``reload``. Files carrying the
+        ``UPDATED_IN_PLACE_TABLE`` marker are written by incremental updates and stay in
+        plain ``mode=ro``, so readers see each update's transaction whole. (An update run
+        by another process is only noticed by ``_source_replaced``, so a server there may
+        read the first update's marker commit through an immutable connection for up to
+        ``SOURCE_CHECK_SECONDS``.) Returns ``None`` (the connection closed again) if the
+        source changed while it was being opened.
+        """
+        uri = path.resolve().as_uri()
+        # Used by one thread only, but closed from ``_close_sources`` on shutdown.
+        conn = sqlite3.connect(f"{uri}?mode=ro", uri=True, check_same_thread=False, factory=_TileConnection)
+        updated_in_place = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (UPDATED_IN_PLACE_TABLE,)
+        ).fetchone()
+        if not updated_in_place:
+            conn.close()
+            conn = sqlite3.connect(
+                f"{uri}?mode=ro&immutable=1", uri=True, check_same_thread=False, factory=_TileConnection
+            )
+            conn.immutable = True
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_kib)}")
+        conn.hilbert_keys = bool(
+            conn.execute("SELECT 1 FROM pragma_table_info('map') WHERE name = 'tile_key'").fetchone()
+        )
+        conn.map_layout = bool(
+            conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images'").fetchone()
+        )
+        conn.generation = generation
+        conn.owner = threading.current_thread()
+        with self._source_lock:
+            # The threadpool retires idle threads; their connections are closed here.
+            orphans = [other for other in self._connections if not other.owner.is_alive()]
+            self._connections = [other for other in self._connections if other.owner.is_alive()]
+            current = generation == self._generation
+            if current:
+                self._connections.append(conn)
+        for orphan in orphans:
+            orphan.close()
+        if not current:
+            conn.close()
+            return None
+        return conn
+
+    def _release_connection(self, conn: sqlite3.Connection) -> None:
+        with self._source_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+            elif conn in self._retired:
+                # Still being read by a request on another thread? It closes it itself.
+                return
+        conn.close()
 
     def _metadata(self) -> Dict[str, str]:
-        cur = self._conn.execute("SELECT name, value FROM metadata")
-        return {row["name"]: row["value"] for row in cur.fetchall()}
+        with self._source() as (conn, reader):
+            if reader:
+                return self._pmtiles_metadata(reader)
+            cur = conn.execute("SELECT name, value FROM metadata")
+            return {row["name"]: row["value"] for row in cur.fetchall()}
 
-    def _fetch_tile(self, z: int, x: int, y: int) -> bytes | None:
-        tms_y = (2 ** z - 1) - y
-        cur = self._conn.execute(
-            "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
-            (z, x, tms_y),
+    @staticmethod
+    def _pmtiles_metadata(reader: PMTilesReader) -> Dict[str, str]:
+        """Present PMTiles metadata in the MBTiles shape (string values, ``json`` row)."""
+        payload = reader.metadata()
+        header = reader.header
+        metadata = {
+            key: value if isinstance(value, str) else json.dumps(value)
+            for key, value in payload.items()
+            if key not in ("vector_layers", "tilestats")
+        }
+        metadata.setdefault("minzoom", str(header.min_zoom))
+        metadata.setdefault("maxzoom", str(header.max_zoom))
+        metadata["json"] = json.dumps(
+            {key: payload[key] for key in ("vector_layers", "tilestats") if key in payload}
         )
-        row = cur.fetchone()
-        if not row:
+        return metadata
+
+    def _fetch_tile(self, z: int, x: int, y: int) -> bytes | None:
+        return self._lookup_tile(z, x, y)[0]
+
+    def _lookup_tile(self, z: int, x: int, y: int) -> Tuple[bytes | None, str | None]:
+        """``(payload, content hash recorded at build time)``; the hash may be ``None``."""
+        with self._source() as (conn, reader):
+            if reader:
+                payload = reader.get(z, x, y)
+                if payload is None:
+                    return None, None
+                # Copied out of the memory map and the slice released before the reader
+                # may be closed: a live slice would keep the mapping open.
+                with payload:
+                    return bytes(payload), None
+            if conn.hilbert_keys:
+                try:
+                    cur = conn.execute(HILBERT_TILE_QUERY, (zxy_to_tileid(z, x, y),))
+                except ValueError:
+                    return None, None
+            else:
+                tms_y = (2 ** z - 1) - y
+                cur = conn.execute(MAP_TILE_QUERY if conn.map_layout else ZXY_TILE_QUERY, (z, x, tms_y))
+            row = cur.fetchone()
+            if not row:
+                return None, None
+            return bytes(row["tile_data"]), row["tile_hash"]
+
+    def _cached_tile(self, z: int, x: int, y: int) -> Tuple[bytes, str] | None:
+        """``(payload, content hash)`` of a tile, through the tile cache."""
+        if self._source_replaced():
+            self.reload()
+        # Keyed by generation so a lookup racing a reload cannot store a stale tile.
+        key = (self._generation, z, x, y)
+        if self._tile_cache:
+            found, tile = self._tile_cache.get(key)
+            if found:
+                return tile
+        payload, tile_hash = self._lookup_tile(z, x, y)
+        tile = None
+        if payload is not None:
+            tile = payload, tile_hash or hashlib.md5(payload, usedforsecurity=False).hexdigest()
+        if self._tile_cache:
+            self._tile_cache.put(key, tile)
+        return tile
+
+    def _version(self) -> str:
+        """Short tag of the served file; changes whenever a new tileset is published."""
+        return hashlib.md5(repr(self._source_identity).encode(), usedforsecurity=False).hexdigest()[:12]
+
+    def _last_modified(self) -> float | None:
+        """Modification time (seconds) of the served file."""
+        return self._source_identity[1] / 1e9 if self._source_identity else None
+
+    def _json_response(self, request: Request, payload: dict) -> Response:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        etag = f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+        headers: Dict[str, str] = {}
+        response = self._conditional_response(request, etag, headers)
+        return response or Response(body, media_type="application/json", headers=headers)
+
+    def _conditional_response(
+        self,
+        request: Request,
+        etag: str,
+        headers: Dict[str, str],
+        versioned: bool = False,
+    ) -> Response | None:
+        """Add the caching headers to ``headers``; return a 304 response if the client's copy is current.
+
+        ``If-None-Match`` takes precedence over ``If-Modified-Since`` (RFC 9110).
+        """
+        headers["ETag"] = etag
+        if versioned:
+            headers["Cache-Control"] = f"public, max-age={self.versioned_max_age}, immutable"
+        else:
+            headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        last_modified = self._last_modified()
+        if last_modified is not None:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            current = "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+        elif request.headers.get("if-modified-since") and last_modified is not None:
+            try:
+                since = parsedate_to_datetime(request.headers["if-modified-since"])
+            except (TypeError, ValueError):
+                return None
+            current = int(last_modified) <= since.timestamp()
+        else:
             return None
-        return bytes(row["tile_data"])
+        return Response(status_code=304, headers=headers) if current else None
+
+    def _file_identity(self) -> tuple | None:
+        try:
+            stat = self.mbtiles_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _source_replaced(self) -> bool:
+        """Whether the served file was replaced since it was opened (checked at most every
+        ``SOURCE_CHECK_SECONDS``), e.g. by a build run outside this process."""
+        now = time.monotonic()
+        if now - self._source_checked_at < self.SOURCE_CHECK_SECONDS:
+            return False
+        with self._source_lock:
+            self._source_checked_at = now
+            identity = self._file_identity()
+            return identity is not None and identity != self._source_identity
+
+    def _stats(self, top_n: int) -> dict:
+        """Tileset statistics of ``stats_path``, recomputed only when the file changes."""
+        if self.stats_path.suffix.lower() != ".mbtiles" or not self.stats_path.exists():
+            raise HTTPException(status_code=404, detail="No MBTiles file to compute statistics from")
+        key = (str(self.stats_path), self.stats_path.stat().st_mtime_ns, top_n)
+        cached = self._stats_cache.get(key)
+        if cached is None:
+            cached = tileset_stats(self.stats_path, top_n=max(0, min(top_n, 100)))
+            self._stats_cache = {key: cached}
+        return cached
+
+    @staticmethod
+    def _accepts_gzip(accept_encoding: str) -> bool:
+        for token in accept_encoding.split(","):
+            coding, _, params = token.strip().partition(";")
+            if coding.strip().lower() not in ("gzip", "*"):
+                continue
+            quality = params.strip().lower()
+            if quality.startswith("q="):
+                try:
+                    return float(quality[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+        return False
 
     def _style_payload(self) -> dict:
         metadata = self._metadata()
         vector_layers = self._vector_layers(metadata)
-        tiles_url = f"http://{self.host}:{self.port}/data/vectiles/{{z}}/{{x}}/{{y}}.pbf"
+        # Versioned tile URLs may be cached for long: a new tileset gets new URLs.
+        tiles_url = f"http://{self.host}:{self.port}/data/vectiles/{{z}}/{{x}}/{{y}}.pbf?v={self._version()}"
         minzoom = int(metadata.get("minzoom", 5))
         maxzoom = int(metadata.get("maxzoom", 12))
         return {
@@ -171,7 +671,7 @@ class PythonTileServer:
         ]
         color = palette[idx % len(palette)]
         layer_id_lower = layer_id.lower()
-        if "line" in layer_id_lower or "road" in layer_id_lower:
+        if any(keyword in layer_id_lower for keyword in ("line", "road", "rail", "power")):
             return {
                 "id": layer_id,
                 "type": "line",
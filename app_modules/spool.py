@@ -0,0 +1,142 @@
+"""On-disk structures for out-of-core tile builds.
+
+``FeatureSpool`` is an append-only file of features (WKB geometry plus JSON properties)
+addressed by byte offset; ``SortedRuns`` collects ``(tile key, feature offset)`` pairs,
+spills them to disk as sorted runs and merges the runs back in key order. Together they
+let the builder stream the input once and then visit tiles in order while holding only
+one block of features in memory.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# layer index, dimension, size (area/length), WKB length, properties length
+_RECORD = struct.Struct("<HbdII")
+PAIR_DTYPE = np.dtype([("key", "<u8"), ("ref", "<u8")])
+
+
+class FeatureSpool:
+    """Append-only feature file; ``append`` returns the offset used to read a feature back."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._handle = self.path.open("wb")
+        self._offset = 0
+        self._fd: int | None = None
+        self._read_lock = threading.Lock()
+
+    def append(self, layer: int, dimension: int, size: float, wkb: bytes, properties: bytes) -> int:
+        offset = self._offset
+        self._handle.write(_RECORD.pack(layer, dimension, size, len(wkb), len(properties)))
+        self._handle.write(wkb)
+        self._handle.write(properties)
+        self._offset += _RECORD.size + len(wkb) + len(properties)
+        return offset
+
+    def finish(self) -> None:
+        """Stop writing and reopen the file for reading."""
+        self._handle.close()
+        self._fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+
+    def read(self, offset: int) -> Tuple[int, int, float, bytes, bytes]:
+        """Return ``(layer, dimension, size, wkb, properties)`` of the feature at ``offset``.
+
+        Uses positioned reads rather than a memory map so that spooled data read back
+        stays in the page cache instead of counting towards the process' memory.
+        """
+        header = self._pread(_RECORD.size, offset)
+        layer, dimension, size, wkb_length, properties_length = _RECORD.unpack(header)
+        body = self._pread(wkb_length + properties_length, offset + _RECORD.size)
+        return layer, dimension, size, body[:wkb_length], body[wkb_length:]
+
+    def _pread(self, length: int, offset: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, length, offset)
+        # Windows has no pread: seek and read under a lock so concurrent reads do not interleave.
+        with self._read_lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            chunks = []
+            while length > 0:
+                chunk = os.read(self._fd, length)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                length -= len(chunk)
+            return b"".join(chunks)
+
+    def close(self) -> None:
+        if not self._handle.closed:
+            self._handle.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SortedRuns:
+    """External merge sort of ``(key, ref)`` pairs.
+
+    Pairs are buffered until ``run_size`` of them are held, then sorted and written as
+    one run file; ``merged`` streams all runs back in ``(key, ref)`` order.
+    """
+
+    def __init__(self, directory: Path, run_size: int = 4_000_000):
+        self.directory = Path(directory)
+        self.run_size = max(1, run_size)
+        self.runs: list[Path] = []
+        self.pairs = 0
+        self._keys: list[np.ndarray] = []
+        self._refs: list[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, keys: np.ndarray, refs: np.ndarray) -> None:
+        if not len(keys):
+            return
+        self._keys.append(np.asarray(keys, dtype=np.uint64))
+        self._refs.append(np.asarray(refs, dtype=np.uint64))
+        self._buffered += len(keys)
+        self.pairs += len(keys)
+        if self._buffered >= self.run_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Sort the buffered pairs and write them as a new run."""
+        if not self._buffered:
+            return
+        keys = np.concatenate(self._keys)
+        refs = np.concatenate(self._refs)
+        self._keys, self._refs, self._buffered = [], [], 0
+        order = np.lexsort((refs, keys))
+        run = np.empty(len(keys), dtype=PAIR_DTYPE)
+        run["key"] = keys[order]
+        run["ref"] = refs[order]
+        del keys, refs, order
+        path = self.directory / f"run-{len(self.runs):05d}.bin"
+        run.tofile(path)
+        self.runs.append(path)
+
+    def merged(self, buffer_pairs: int = 262_144) -> Iterator[Tuple[int, int]]:
+        """Yield every pair in ``(key, ref)`` order.
+
+        The runs share a read buffer of ``buffer_pairs`` pairs, so merging many runs does
+        not grow the working set.
+        """
+        self.flush()
+        read_size = max(1024, buffer_pairs // max(len(self.runs), 1))
+        return heapq.merge(*(self._read_run(path, read_size) for path in self.runs))
+
+    @staticmethod
+    def _read_run(path: Path, read_size: int) -> Iterator[Tuple[int, int]]:
+        if not path.stat().st_size:
+            return
+        pairs = np.memmap(path, dtype=PAIR_DTYPE, mode="r")
+        for start in range(0, len(pairs), read_size):
+            yield from pairs[start:start + read_size].tolist()
+        del pairs
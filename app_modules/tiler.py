@@ -6,6 +6,7 @@ import subprocess
 from pathlib import Path
 from typing import Optional
 
+from .publish import register_release_hook, unregister_release_hook
 from .py_tileserver import PythonTileServer
 
 class TileServerManager:
@@ -15,7 +16,13 @@ class TileServerManager:
         self.port: int = config["port"]
         self.config_path: Path = Path(config["config_path"])
         self.mbtiles_path: Path = Path(config["mbtiles"])
+        self.pmtiles_path: Optional[Path] = Path(config["pmtiles"]) if config.get("pmtiles") else None
         self.style_url: str = config["style_url"]
+        self.sqlite_mmap_bytes: int = config.get("sqlite_mmap_bytes", 256 * 1024 * 1024)
+        self.sqlite_cache_kib: int = config.get("sqlite_cache_kib", 8192)
+        self.tile_cache_bytes: int = config.get("tile_cache_bytes", 64 * 1024 * 1024)
+        self.http_max_age: int = config.get("http_max_age", 300)
+        self.http_versioned_max_age: int = config.get("http_versioned_max_age", 365 * 24 * 3600)
         self._process: Optional[subprocess.Popen] = None
         self._python_server: Optional[PythonTileServer] = None
 
@@ -60,16 +67,52 @@ class TileServerManager:
     def _start_python_server(self) -> bool:
         if self._python_server:
             return True
-        if not self.mbtiles_path.exists():
+        source = self._python_source()
+        if not source.exists():
             print(f"[TileServerManager] MBTiles not found: {self.mbtiles_path}", flush=True)
             return False
-        self._python_server = PythonTileServer(self.mbtiles_path, self.port)
+        self._python_server = PythonTileServer(
+            source,
+            self.port,
+            stats_path=self.mbtiles_path,
+            mmap_size=self.sqlite_mmap_bytes,
+            cache_kib=self.sqlite_cache_kib,
+            tile_cache_bytes=self.tile_cache_bytes,
+            max_age=self.http_max_age,
+            versioned_max_age=self.http_versioned_max_age,
+        )
+        # Builds running in this process make the server let go of the file they replace.
+        register_release_hook(self._python_server.released)
         return self._python_server.start()
 
+    def _python_source(self) -> Path:
+        """Prefer the PMTiles archive when it is at least as fresh as the MBTiles file."""
+        pmtiles = self.pmtiles_path
+        if pmtiles and pmtiles.exists():
+            if not self.mbtiles_path.exists() or pmtiles.stat().st_mtime >= self.mbtiles_path.stat().st_mtime:
+                return pmtiles
+        return self.mbtiles_path
+
+    def reload(self) -> bool:
+        """Pick up a newly published tileset.
+
+        The Python server reopens its source in place; TileServer GL is restarted.
+        """
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            self._process.wait(timeout=10)
+            self._process = None
+            return self.start()
+        if self._python_server:
+            self._python_server.reload(self._python_source())
+            return True
+        return self.start()
+
     def stop(self):
         if self._process and self._process.poll() is None:
             self._process.terminate()
             self._process.wait(timeout=10)
         if self._python_server:
+            unregister_release_hook(self._python_server.released)
             self._python_server.stop()
             self._python_server = None
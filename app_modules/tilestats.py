@@ -0,0 +1,103 @@
+"""Tileset statistics: tile counts and sizes per zoom plus the heaviest tiles.
+
+Works on any MBTiles file (tippecanoe output as well as the Python builder's
+``map``/``images`` layout, read through its ``tiles`` view). Sizes are the stored,
+usually gzipped, bytes, i.e. what a client downloads. ``tileset_stats.py`` at the
+repository root prints the report for a file.
+"""
+
+from __future__ import annotations
+
+import gzip
+import sqlite3
+from pathlib import Path
+from typing import Mapping
+
+import mapbox_vector_tile
+import numpy as np
+
+GZIP_MAGIC = b"\x1f\x8b"
+PERCENTILES = (50, 90, 99)
+
+
+def tileset_stats(
+    mbtiles_path: Path | str,
+    top_n: int = 10,
+    encode_stats: Mapping[int, Mapping[str, float]] | None = None,
+) -> dict:
+    """Summarize ``mbtiles_path``.
+
+    Returns per-zoom tile counts, total bytes and size percentiles (``zooms``), the same
+    figures for the whole tileset (``total``) and the ``top_n`` largest tiles with their
+    XYZ address and feature count per layer (``largest_tiles``). ``encode_stats`` (the
+    Python builder's per-zoom ``{"tiles", "seconds"}``) is merged into ``zooms``.
+    """
+    conn = sqlite3.connect(f"{Path(mbtiles_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT zoom_level, length(tile_data) FROM tiles")
+        sizes = np.array(rows.fetchall(), dtype=np.int64).reshape(-1, 2)
+        largest = conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles "
+            "ORDER BY length(tile_data) DESC LIMIT ?",
+            (top_n,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    zooms: dict[str, dict] = {}
+    for zoom in np.unique(sizes[:, 0]):
+        zoom_stats = _size_summary(sizes[sizes[:, 0] == zoom, 1])
+        encoded = (encode_stats or {}).get(int(zoom))
+        if encoded:
+            zoom_stats["encode_seconds"] = round(encoded["seconds"], 3)
+            zoom_stats["encode_ms_per_tile"] = round(1000 * encoded["seconds"] / max(encoded["tiles"], 1), 3)
+        zooms[str(int(zoom))] = zoom_stats
+    return {
+        "zooms": zooms,
+        "total": _size_summary(sizes[:, 1]),
+        "largest_tiles": [_tile_report(*row) for row in largest],
+    }
+
+
+def _size_summary(sizes: np.ndarray) -> dict:
+    if not len(sizes):
+        return {"tiles": 0, "bytes": 0}
+    summary = {"tiles": int(len(sizes)), "bytes": int(sizes.sum())}
+    for percentile, value in zip(PERCENTILES, np.percentile(sizes, PERCENTILES)):
+        summary[f"p{percentile}"] = int(round(value))
+    summary["max"] = int(sizes.max())
+    return summary
+
+
+def _tile_report(zoom: int, column: int, tms_row: int, data: bytes) -> dict:
+    payload = bytes(data)
+    if payload[:2] == GZIP_MAGIC:
+        payload = gzip.decompress(payload)
+    decoded = mapbox_vector_tile.decode(payload)
+    return {
+        "z": zoom,
+        "x": column,
+        "y": (2 ** zoom - 1) - tms_row,
+        "bytes": len(data),
+        "raw_bytes": len(payload),
+        "features": {name: len(layer.get("features", [])) for name, layer in decoded.items()},
+    }
+
+
+def format_stats(stats: dict) -> str:
+    """Plain-text table of ``tileset_stats`` output for the terminal."""
+    lines = [f"{'zoom':>4} {'tiles':>9} {'MB':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'ms/tile':>8}"]
+    for zoom, row in [*stats["zooms"].items(), ("all", stats["total"])]:
+        if not row["tiles"]:
+            continue
+        lines.append(
+            f"{zoom:>4} {row['tiles']:>9} {row['bytes'] / 1e6:>8.2f} {row['p50']:>8} {row['p90']:>8} "
+            f"{row['p99']:>8} {row['max']:>8} {row.get('encode_ms_per_tile', ''):>8}"
+        )
+    if stats["largest_tiles"]:
+        lines.append("")
+        lines.append("Largest tiles:")
+        for tile in stats["largest_tiles"]:
+            layers = ", ".join(f"{name} {count}" for name, count in tile["features"].items())
+            lines.append(f"  {tile['z']}/{tile['x']}/{tile['y']}  {tile['bytes']} B  ({layers})")
+    return "\n".join(lines)
@@ -0,0 +1,104 @@
+"""Compare the per-tile and bulk-load MBTiles writers on a synthetic tileset.
+
+Tile sizes follow a log-normal distribution (median around 650 bytes), which is close
+to what the Python builder produces for OSM layers. Each writer runs ``--repeat`` times
+and the best time is reported.
+
+Usage: python benchmarks/mbtiles_bulk_load.py [--tiles 200000] [--max-zoom 14] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_modules.mbtiles import VectorMBTilesBuilder, _EncodedTile  # noqa: E402
+
+
+def _synthetic_tiles(count: int, max_zoom: int, seed: int = 7) -> list[_EncodedTile]:
+    rng = random.Random(seed)
+    tiles: dict[tuple[int, int, int], bytes] = {}
+    while len(tiles) < count:
+        z = rng.randint(max(0, max_zoom - 4), max_zoom)
+        x = rng.randrange(2 ** z)
+        y = rng.randrange(2 ** z)
+        size = min(max(int(rng.lognormvariate(6.5, 1.0)), 64), 64_000)
+        tiles[(z, x, y)] = os.urandom(size)
+    return [_EncodedTile(tile_id, data) for tile_id, data in sorted(tiles.items())]
+
+
+def _write(path: Path, tiles, bulk_load: bool, vacuum: bool = False, checkpoint_blocks: int = 0) -> float:
+    builder = VectorMBTilesBuilder(
+        path,
+        min_zoom=0,
+        max_zoom=22,
+        bulk_load=bulk_load,
+        vacuum=vacuum,
+        checkpoint_blocks=checkpoint_blocks,
+    )
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        if bulk_load:
+            builder._apply_bulk_pragmas(conn)
+        builder._initialize_db(conn, create_index=not bulk_load)
+        builder._write_tiles(conn, iter(tiles), len(tiles))
+        if bulk_load:
+            builder._finalize_bulk_load(conn)
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def _contents(path: Path) -> list[tuple]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles ORDER BY zoom_level, tile_column, tile_row"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tiles", type=int, default=200_000)
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tiles = _synthetic_tiles(args.tiles, args.max_zoom)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        per_tile_path = Path(tmpdir) / "per_tile.mbtiles"
+        bulk_path = Path(tmpdir) / "bulk.mbtiles"
+        vacuum_path = Path(tmpdir) / "bulk_vacuum.mbtiles"
+        wal_path = Path(tmpdir) / "bulk_wal.mbtiles"
+        per_tile = bulk = bulk_vacuum = bulk_wal = float("inf")
+        for _ in range(max(1, args.repeat)):
+            for path in (per_tile_path, bulk_path, vacuum_path, wal_path):
+                path.unlink(missing_ok=True)
+            per_tile = min(per_tile, _write(per_tile_path, tiles, bulk_load=False))
+            bulk = min(bulk, _write(bulk_path, tiles, bulk_load=True))
+            bulk_vacuum = min(bulk_vacuum, _write(vacuum_path, tiles, bulk_load=True, vacuum=True))
+            # Resumable builds keep a WAL so checkpoints survive a killed process.
+            bulk_wal = min(bulk_wal, _write(wal_path, tiles, bulk_load=True, checkpoint_blocks=64))
+        reference = _contents(per_tile_path)
+        identical = reference == _contents(bulk_path) == _contents(vacuum_path) == _contents(wal_path)
+        print(f"tiles:          {len(tiles)}")
+        print(f"per-tile:       {per_tile:.2f}s ({per_tile_path.stat().st_size / 1e6:.1f} MB)")
+        print(f"bulk-load:      {bulk:.2f}s ({bulk_path.stat().st_size / 1e6:.1f} MB, {per_tile / bulk:.2f}x)")
+        print(f"bulk + VACUUM:  {bulk_vacuum:.2f}s ({vacuum_path.stat().st_size / 1e6:.1f} MB, {per_tile / bulk_vacuum:.2f}x)")
+        print(f"bulk + WAL:     {bulk_wal:.2f}s ({wal_path.stat().st_size / 1e6:.1f} MB, {per_tile / bulk_wal:.2f}x)")
+        print(f"identical:      {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Peak memory of the in-memory and the external-memory (spooled) Python builds.
+
+A synthetic buildings layer of ``--features`` small polygons, spread over a city-sized
+area, is written as GeoJSON and built once in each mode, every build in its own process
+so the peak resident set size (``ru_maxrss``) of one does not hide the other. The
+in-memory build holds every geometry plus its tile index; the spooled build holds one
+sorted run of ``--run-pairs`` pairs and the blocks in flight, so its peak should stay
+flat as ``--features`` grows while the in-memory peak grows with it. Both tilesets are
+compared tile by tile.
+
+Unix only (``resource``). Usage:
+python benchmarks/mbtiles_external_memory.py [--features 1000000] [--max-zoom 14]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_modules.mbtiles import VectorMBTilesBuilder  # noqa: E402
+
+
+def _write_layer(path: Path, count: int, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    x0, y0, span = 2.20, 48.80, 0.30
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write('{"type": "FeatureCollection", "features": [\n')
+        for index in range(count):
+            x = x0 + rng.random() * span
+            y = y0 + rng.random() * span
+            size = 0.00005 + rng.random() * 0.0002
+            feature = {
+                "type": "Feature",
+                "properties": {"osm_id": str(index), "fclass": rng.choice(("building", "house", "garage"))},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]],
+                },
+            }
+            handle.write(("," if index else "") + json.dumps(feature) + "\n")
+        handle.write("]}\n")
+
+
+def _build(layer: Path, output: Path, min_zoom: int, max_zoom: int, external: bool, run_pairs: int) -> None:
+    """Child process: build ``output`` and print the seconds and peak RSS in MB as JSON."""
+    builder = VectorMBTilesBuilder(
+        output,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        external_memory=external,
+        spool_run_pairs=run_pairs,
+    )
+    start = time.perf_counter()
+    result = builder.build([("buildings", str(layer))])
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "peak_mb": peak_kib / 1024,
+        "tiles": result["tiles_written"],
+    }))
+
+
+def _run(args: argparse.Namespace, layer: Path, output: Path, external: bool) -> dict:
+    command = [
+        sys.executable, __file__, "--child", str(layer), str(output),
+        "--min-zoom", str(args.min_zoom), "--max-zoom", str(args.max_zoom), "--run-pairs", str(args.run_pairs),
+    ]
+    if external:
+        command.append("--external")
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _contents(path: Path) -> list[tuple]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles ORDER BY zoom_level, tile_column, tile_row"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--features", type=int, default=1_000_000)
+    parser.add_argument("--min-zoom", type=int, default=10)
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--run-pairs", type=int, default=4_000_000)
+    parser.add_argument("--external", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", nargs=2, metavar=("LAYER", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _build(Path(args.child[0]), Path(args.child[1]), args.min_zoom, args.max_zoom, args.external, args.run_pairs)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        layer = Path(tmpdir) / "buildings.geojson"
+        _write_layer(layer, args.features)
+        in_memory_path = Path(tmpdir) / "in_memory.mbtiles"
+        external_path = Path(tmpdir) / "external.mbtiles"
+        in_memory = _run(args, layer, in_memory_path, external=False)
+        external = _run(args, layer, external_path, external=True)
+        print(f"features:       {args.features} ({layer.stat().st_size / 1e6:.0f} MB of GeoJSON)")
+        print(f"tiles:          {in_memory['tiles']}")
+        print(f"in-memory:      {in_memory['seconds']:.1f}s, peak RSS {in_memory['peak_mb']:.0f} MB")
+        print(f"external:       {external['seconds']:.1f}s, peak RSS {external['peak_mb']:.0f} MB")
+        print(f"identical:      {_contents(in_memory_path) == _contents(external_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Replay map viewports against the ``(z, x, y)`` and the Hilbert-clustered MBTiles layouts.
+
+Both files hold the same synthetic tileset: every tile of a square region from
+``--min-zoom`` to ``--max-zoom`` (``--extent`` tiles wide at the top zoom) with log-normal
+tile sizes as in ``mbtiles_bulk_load.py``, written the way the Python builder writes them.
+A random walk of viewports (``--width`` x ``--height`` tiles, panning and zooming) is then
+fetched through the tile server's lookup, once with a cold cache per viewport (the
+connection is reopened and the file dropped from the OS page cache, where the platform
+allows it) and once warm. Reported are the time per viewport and, on Linux, the bytes
+read from disk per cold viewport. The server reads with ``pread`` unless ``--mmap-size`` is
+set: page faults on a memory map pull in whole readahead windows, which would hide how
+many pages a layout actually touches.
+
+Usage: python benchmarks/mbtiles_viewport_replay.py [--extent 256] [--viewports 1000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_modules.mbtiles import VectorMBTilesBuilder, _EncodedTile  # noqa: E402
+from app_modules.py_tileserver import PythonTileServer  # noqa: E402
+
+
+def _region(min_zoom: int, max_zoom: int, extent: int) -> dict[int, tuple[int, int, int]]:
+    """``zoom -> (first column, first row, width)`` of a square region centred in the world."""
+    region = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        width = max(1, extent >> (max_zoom - zoom))
+        first = ((1 << zoom) - width) // 2
+        region[zoom] = (first, first, width)
+    return region
+
+
+def _write(path: Path, region: dict, hilbert_layout: bool, seed: int = 7) -> float:
+    builder = VectorMBTilesBuilder(path, min_zoom=min(region), max_zoom=max(region), hilbert_layout=hilbert_layout)
+    rng = random.Random(seed)
+    tile_ids = [
+        (zoom, first_x + dx, first_y + dy)
+        for zoom, (first_x, first_y, width) in region.items()
+        for dx in range(width)
+        for dy in range(width)
+    ]
+    # Same bytes for a tile in both files, whatever order it is written in.
+    sizes = {tile_id: min(max(int(rng.lognormvariate(6.5, 1.0)), 64), 64_000) for tile_id in tile_ids}
+    tiles = (
+        _EncodedTile(tile_id, random.Random(hash(tile_id)).randbytes(sizes[tile_id]))
+        for tile_id in builder._ordered(tile_ids)
+    )
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        builder._apply_bulk_pragmas(conn)
+        builder._initialize_db(conn, create_index=False)
+        builder._write_tiles(conn, tiles, len(tile_ids))
+        builder._finalize_bulk_load(conn)
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def _viewports(region: dict, count: int, width: int, height: int, seed: int = 11) -> list[list[tuple[int, int, int]]]:
+    """A random walk: mostly pans of up to two tiles, sometimes a zoom step, sometimes a jump."""
+    rng = random.Random(seed)
+    zooms = sorted(region)
+    viewports = []
+    zoom = x = y = None
+    for _ in range(count):
+        if zoom is None or rng.random() < 0.05:
+            zoom = rng.choice(zooms[len(zooms) // 2:])
+            first_x, first_y, size = region[zoom]
+            x, y = first_x + rng.randrange(size), first_y + rng.randrange(size)
+        elif rng.random() < 0.15:
+            step = rng.choice((-1, 1))
+            if zoom + step in region:
+                zoom += step
+                x, y = (x * 2, y * 2) if step > 0 else (x // 2, y // 2)
+        else:
+            x += rng.randint(-2, 2)
+            y += rng.randint(-2, 2)
+        first_x, first_y, size = region[zoom]
+        x = min(max(x, first_x), first_x + size - 1)
+        y = min(max(y, first_y), first_y + size - 1)
+        viewports.append(
+            [
+                (zoom, column, row)
+                for column in range(x - width // 2, x - width // 2 + width)
+                for row in range(y - height // 2, y - height // 2 + height)
+            ]
+        )
+    return viewports
+
+
+def _disk_read_bytes() -> int | None:
+    try:
+        with open("/proc/self/io") as handle:
+            return int(dict(line.split(": ") for line in handle.read().splitlines())["read_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _drop_page_cache(path: Path) -> bool:
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def _replay(path: Path, viewports, cold: bool, mmap_size: int = 0) -> tuple[float, float | None, int]:
+    """Mean milliseconds and disk bytes per viewport, and the number of tiles found."""
+    server = PythonTileServer(path, port=0, mmap_size=mmap_size)
+    elapsed = 0.0
+    read_bytes = 0
+    found = 0
+    measure_reads = cold and _disk_read_bytes() is not None
+    try:
+        for viewport in viewports:
+            if cold:
+                server._close_sources()
+                measure_reads = _drop_page_cache(path) and measure_reads
+            before = _disk_read_bytes() if measure_reads else 0
+            start = time.perf_counter()
+            found += sum(server._fetch_tile(*tile_id) is not None for tile_id in viewport)
+            elapsed += time.perf_counter() - start
+            if measure_reads:
+                read_bytes += _disk_read_bytes() - before
+    finally:
+        server._close_sources()
+    per_viewport_reads = read_bytes / len(viewports) if measure_reads else None
+    return 1000 * elapsed / len(viewports), per_viewport_reads, found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--min-zoom", type=int, default=8)
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--extent", type=int, default=256, help="region width in tiles at --max-zoom")
+    parser.add_argument("--viewports", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--height", type=int, default=4)
+    parser.add_argument("--mmap-size", type=int, default=0, help="SQLite mmap_size of the server connections")
+    parser.add_argument("--dir", type=Path, default=None, help="directory for the test files (a disk, not tmpfs)")
+    args = parser.parse_args()
+
+    region = _region(args.min_zoom, args.max_zoom, args.extent)
+    viewports = _viewports(region, args.viewports, args.width, args.height)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        results = {}
+        for name, hilbert_layout in (("z/x/y", False), ("hilbert", True)):
+            path = Path(tmpdir) / f"{name.replace('/', '')}.mbtiles"
+            write_seconds = _write(path, region, hilbert_layout)
+            cold_ms, cold_bytes, found = _replay(path, viewports, cold=True, mmap_size=args.mmap_size)
+            warm_ms, _, _ = _replay(path, viewports, cold=False, mmap_size=args.mmap_size)
+            results[name] = (write_seconds, path.stat().st_size, cold_ms, cold_bytes, warm_ms, found)
+
+        tiles = sum(width * width for _, _, width in region.values())
+        print(f"tiles: {tiles}, viewports: {len(viewports)} of {args.width}x{args.height} tiles")
+        print(f"{'layout':<8} {'write s':>8} {'MB':>7} {'cold ms/vp':>11} {'cold KB/vp':>11} {'warm ms/vp':>11}")
+        for name, (write_seconds, size, cold_ms, cold_bytes, warm_ms, found) in results.items():
+            cold_kb = f"{cold_bytes / 1024:.1f}" if cold_bytes is not None else "n/a"
+            print(f"{name:<8} {write_seconds:>8.2f} {size / 1e6:>7.1f} {cold_ms:>11.2f} {cold_kb:>11} {warm_ms:>11.3f}")
+        print(f"same tiles found: {len({result[-1] for result in results.values()}) == 1}")
+
+
+if __name__ == "__main__":
+    main()
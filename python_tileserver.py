@@ -7,7 +7,15 @@ def main():
     tileserver_cfg = APP_CONFIG["tileserver"]
     mbtiles_path = Path(tileserver_cfg["mbtiles"])
     port = tileserver_cfg["port"]
-    server = PythonTileServer(mbtiles_path, port)
+    server = PythonTileServer(
+        mbtiles_path,
+        port,
+        mmap_size=tileserver_cfg.get("sqlite_mmap_bytes", 256 * 1024 * 1024),
+        cache_kib=tileserver_cfg.get("sqlite_cache_kib", 8192),
+        tile_cache_bytes=tileserver_cfg.get("tile_cache_bytes", 64 * 1024 * 1024),
+        max_age=tileserver_cfg.get("http_max_age", 300),
+        versioned_max_age=tileserver_cfg.get("http_versioned_max_age", 365 * 24 * 3600),
+    )
     try:
         server.start(block=True)
     except KeyboardInterrupt:
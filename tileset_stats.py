@@ -0,0 +1,20 @@
+import argparse
+import json
+from pathlib import Path
+
+from app_modules import APP_CONFIG
+from app_modules.tilestats import format_stats, tileset_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tile counts, size percentiles and largest tiles of an MBTiles file.")
+    parser.add_argument("mbtiles", type=Path, nargs="?", default=Path(APP_CONFIG["mbtiles"]["output"]))
+    parser.add_argument("--top", type=int, default=APP_CONFIG["mbtiles"]["stats_top_n"], help="number of largest tiles to list")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON report")
+    args = parser.parse_args()
+    stats = tileset_stats(args.mbtiles, top_n=args.top)
+    print(json.dumps(stats, indent=2) if args.json else format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()